@@ -0,0 +1,118 @@
+"""
+Measure the throughput of transforming cells by directive.
+
+Usage
+-----
+    python benchmarks/bench_directive_scanner.py [--repeat N] [notebook ...]
+
+Runs every cell of the given notebooks (by default, every notebook under src/)
+through `transform_cell_by_directive` from make_reader_friendly_notebooks.py, and
+through the previous implementation, which ran `re.findall`/`re.sub` with string
+patterns over the full source of every cell. Reports both throughputs in cells per
+second.
+
+The two implementations are also checked against each other: every markdown cell
+must be transformed identically, or the script exits with a nonzero status. (Code
+cells are not compared, as they are no longer scanned for directives at all.)
+"""
+
+import argparse
+import copy
+import pathlib
+import re
+import sys
+import time
+
+import yaml
+import nbformat
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import make_reader_friendly_notebooks
+
+
+# the previous implementation
+# ======================================================================================
+
+def legacy_remove_directive_markup(source):
+    source = re.sub(r'^`{3,}\{.+\}', '', source)
+    source = re.sub('`{3,}$', '', source)
+    return source.strip()
+
+
+def legacy_transform_cell_by_directive(cell):
+    all_directives = re.findall(r'`{3,}\{(.+)\}', cell['source'])
+    if len(all_directives) != 1:
+        return
+
+    directive = all_directives[0]
+    if directive in make_reader_friendly_notebooks.ADMONITION_DIRECTIVES:
+        source = legacy_remove_directive_markup(cell['source'])
+        header = make_reader_friendly_notebooks.HEADERS.get(directive, directive.title())
+        cell['source'] = f"**{header}**\n\n{source}"
+    elif directive == 'hiddenanswer':
+        source = legacy_remove_directive_markup(cell['source'])
+        content = yaml.load(source, Loader=yaml.Loader)
+        cell['source'] = f"**Question**:\n {content['question']}\n\n<details><summary><b>Answer</b>:</summary>{content['answer']}</details>"
+
+
+# timing
+# ======================================================================================
+
+def throughput(transform, cells, repeat):
+    """Returns the best throughput, in cells per second, over `repeat` passes."""
+    best = float('inf')
+    for _ in range(repeat):
+        # copy outside of the timed region, as the transforms modify cells in-place
+        fresh = copy.deepcopy(cells)
+        start = time.perf_counter()
+        for cell in fresh:
+            transform(cell)
+        best = min(best, time.perf_counter() - start)
+    return len(cells) / best
+
+
+def count_mismatches(cells):
+    mismatches = 0
+    for cell in cells:
+        if cell['cell_type'] != 'markdown':
+            continue
+        before, after = copy.deepcopy(cell), copy.deepcopy(cell)
+        legacy_transform_cell_by_directive(before)
+        make_reader_friendly_notebooks.transform_cell_by_directive(after)
+        mismatches += before['source'] != after['source']
+    return mismatches
+
+
+def main(notebook_paths, repeat):
+    cells = []
+    for path in notebook_paths:
+        with path.open() as fileobj:
+            cells.extend(nbformat.read(fileobj, as_version=4)['cells'])
+
+    before = throughput(legacy_transform_cell_by_directive, cells, repeat)
+    after = throughput(make_reader_friendly_notebooks.transform_cell_by_directive, cells, repeat)
+
+    print(f'{len(cells)} cells from {len(notebook_paths)} notebooks, best of {repeat} passes')
+    print(f'{"before":<8}{before:>14,.0f} cells/s')
+    print(f'{"after":<8}{after:>14,.0f} cells/s')
+    print(f'{"speedup":<8}{after / before:>13.1f}x')
+
+    mismatches = count_mismatches(cells)
+    if mismatches:
+        print(f'MISMATCH: {mismatches} markdown cells transformed differently', file=sys.stderr)
+    return not mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('notebooks', nargs='*', type=pathlib.Path)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    notebook_paths = args.notebooks or sorted(
+        make_reader_friendly_notebooks.find_notebooks(ROOT / 'src'))
+
+    if not main(notebook_paths, args.repeat):
+        sys.exit(1)
@@ -0,0 +1,163 @@
+"""
+Measure the time to parse a page of hidden answers.
+
+Usage
+-----
+    python benchmarks/bench_hiddenanswer.py [--answers N] [--repeat N]
+
+Writes a page with N (by default 200) `{hiddenanswer}` directives, half of them
+with a code block as the answer, and reads it with Sphinx using the hiddenanswer
+extension, and using the previous implementation, which generated `{tabs}`
+markup for sphinx-tabs and parsed that. Reports the best time of each to read
+the page.
+
+The two are also checked against each other: the text of each question and
+answer must be the same, or the script exits with a nonzero status.
+"""
+
+import argparse
+import io
+import pathlib
+import sys
+import tempfile
+import time
+
+from docutils import nodes
+from sphinx.application import Sphinx
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'extensions'))
+
+import hiddenanswer
+
+
+# the previous implementation
+# ======================================================================================
+
+class LegacyHiddenAnswerDirective(hiddenanswer.HiddenAnswerDirective):
+
+    def run(self):
+        node = hiddenanswer.hiddenanswer()
+
+        s = f"""
+```````{{tabs}}
+``````{{tab}} Question
+
+{self.options['question']}
+``````
+``````{{tab}} Answer
+
+{self.options['answer']}
+``````
+
+```````
+        """
+
+        self.content = [s]
+        self.state.nested_parse(self.content, 0, node)
+
+        return [node]
+
+
+# the page
+# ======================================================================================
+
+CONF = """
+extensions = ['myst_parser', 'sphinx_tabs.tabs', 'hiddenanswer']
+"""
+
+SHORT_ANSWER = """\
+```{{hiddenanswer}}
+---
+question: What is the value of `{i} + 1`?
+answer: It is **{j}**.
+```
+"""
+
+CODE_ANSWER = """\
+````{{hiddenanswer}}
+---
+question: |
+    How would you make an array of the first {i} powers of 2?
+answer: |
+    ```python
+    2**np.arange({i})
+    ```
+````
+"""
+
+
+def make_page(answers):
+    blocks = ['# Practice Questions\n']
+    for i in range(answers):
+        template = CODE_ANSWER if i % 2 else SHORT_ANSWER
+        blocks.append(template.format(i=i, j=i + 1))
+    return '\n'.join(blocks)
+
+
+# timing
+# ======================================================================================
+
+def read_page(srcdir, legacy):
+    """Reads the page from scratch. Returns the time taken and the doctree."""
+    with tempfile.TemporaryDirectory() as outdir:
+        outdir = pathlib.Path(outdir)
+        app = Sphinx(srcdir, srcdir, outdir / 'out', outdir / 'doctrees', 'dummy',
+                     status=None, warning=io.StringIO(), freshenv=True)
+        if legacy:
+            app.add_directive('hiddenanswer', LegacyHiddenAnswerDirective, override=True)
+
+        start = time.perf_counter()
+        app.build(force_all=True)
+        elapsed = time.perf_counter() - start
+
+        return elapsed, app.env.get_doctree('index')
+
+
+def question_and_answer_texts(doctree):
+    """The text of every hidden answer, without the tab labels."""
+    texts = []
+    for node in doctree.traverse(hiddenanswer.hiddenanswer):
+        paragraphs = [n.astext() for n in node.traverse(nodes.TextElement)
+                      if not isinstance(n.parent, nodes.TextElement)]
+        texts.append([text for text in paragraphs if text not in ('Question', 'Answer')])
+    return texts
+
+
+def main(answers, repeat):
+    with tempfile.TemporaryDirectory() as srcdir:
+        srcdir = pathlib.Path(srcdir)
+        (srcdir / 'conf.py').write_text(CONF)
+        (srcdir / 'index.md').write_text(make_page(answers))
+
+        results = {}
+        for label, legacy in [('before', True), ('after', False)]:
+            times, doctree = [], None
+            for _ in range(repeat):
+                elapsed, doctree = read_page(srcdir, legacy)
+                times.append(elapsed)
+            results[label] = min(times), question_and_answer_texts(doctree)
+
+    before, before_texts = results['before']
+    after, after_texts = results['after']
+
+    print(f'a page of {answers} hidden answers, best of {repeat} reads')
+    print(f'{"before":<8}{before * 1000:>10.1f} ms')
+    print(f'{"after":<8}{after * 1000:>10.1f} ms')
+    print(f'{"speedup":<8}{before / after:>9.1f}x')
+
+    mismatches = sum(b != a for b, a in zip(before_texts, after_texts))
+    mismatches += abs(len(before_texts) - len(after_texts))
+    if mismatches:
+        print(f'MISMATCH: {mismatches} hidden answers parsed differently', file=sys.stderr)
+    return not mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--answers', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if not main(args.answers, args.repeat):
+        sys.exit(1)
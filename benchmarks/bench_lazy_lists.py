@@ -0,0 +1,134 @@
+"""
+Check that lazy admonition lists are the same as eager ones.
+
+Usage
+-----
+    python benchmarks/bench_lazy_lists.py [--pages N]
+
+Generates, in a temporary directory, a book of N pages, each with a
+`jupytertip` and a `tip` which contain references of every kind the notes use:
+glossary terms by `dterm` and `term`, section labels, numbered figures, and
+documents, also from a subdirectory. A page lists them all with
+`jupytertiplist` and `tiplist`. The book is built with the extensions in
+extensions/ twice, with `admonitionlists_lazy` off and on.
+
+The body of the page of lists must be the same in both builds, or the script
+exits with a nonzero status. Reports the time of each build and the size of
+its pickled environment.
+"""
+
+import argparse
+import difflib
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+# the book
+# ======================================================================================
+
+CONF = """
+extensions = ['myst_parser', 'jupytertips', 'admonitionlists', 'dterms']
+numfig = True
+"""
+
+PAGE = """\
+({label})=
+# Page {i}
+
+```{{jupytertip}}
+Jupyter tip on page {i}, about "arrays": {{dterm}}`arrays <array>`, {{term}}`array`,
+{{ref}}`{label}`, {{numref}}`{figure}`, and {{doc}}`{document}`.
+```
+
+```{{tip}}
+Tip on page {i}: see {{doc}}`/index` and {{ref}}`section-0`.
+```
+
+```{{figure}} https://example.com/figure.png
+:name: {figure}
+
+A figure.
+```
+"""
+
+GLOSSARY = '# Glossary\n\n```{glossary}\narray\n    A sequence of values.\n```\n'
+
+LISTS = '# Lists\n\n```{jupytertiplist}\n```\n\n```{tiplist}\n```\n'
+
+BODY_PATTERN = re.compile(r'<h1>Lists.*?<div class="sphinxsidebar"', re.DOTALL)
+
+
+def make_book(directory, pages):
+    (directory / 'sub').mkdir(parents=True)
+    (directory / 'conf.py').write_text(CONF)
+
+    page_names = []
+    for i in range(pages):
+        # every other page is in a subdirectory, so that relative references differ
+        name = f'sub/page{i}' if i % 2 else f'page{i}'
+        document = f'../page{i - 1}' if i % 2 else '/index'
+        (directory / f'{name}.md').write_text(PAGE.format(
+            i=i, label=f'section-{i}', figure=f'figure-{i}', document=document))
+        page_names.append(name)
+
+    toctree = '\n'.join(['```{toctree}', *page_names, 'glossary', 'lists', '```'])
+    (directory / 'index.md').write_text(f'# Book\n\n{toctree}\n')
+    (directory / 'glossary.md').write_text(GLOSSARY)
+    (directory / 'lists.md').write_text(LISTS)
+
+
+def build(book, output, lazy):
+    """Builds the book as HTML, returning the wall time it took."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT / 'extensions'), os.environ.get('PYTHONPATH', '')]
+    ))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'sphinx', '-q', '-W',
+                    '-D', f'admonitionlists_lazy={int(lazy)}',
+                    '-b', 'html', str(book), str(output)], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def read_lists(output):
+    """Returns the body of the page of lists."""
+    return BODY_PATTERN.search((output / 'lists.html').read_text()).group()
+
+
+def main(pages):
+    with tempfile.TemporaryDirectory() as workdir:
+        book = pathlib.Path(workdir) / 'book'
+        make_book(book, pages)
+
+        bodies = {}
+        for lazy in [False, True]:
+            output = pathlib.Path(workdir) / f'build_{"lazy" if lazy else "eager"}'
+            seconds = build(book, output, lazy)
+            size = (output / '.doctrees' / 'environment.pickle').stat().st_size
+            print(f'admonitionlists_lazy = {lazy}: built in {seconds:.2f} s, '
+                  f'environment of {size / 1024:.1f} KiB')
+            bodies[lazy] = read_lists(output)
+
+    if bodies[False] != bodies[True]:
+        diff = difflib.unified_diff(
+            bodies[False].splitlines(), bodies[True].splitlines(),
+            'eager/lists.html', 'lazy/lists.html', lineterm='')
+        print('MISMATCH: the lists differ', *diff, sep='\n', file=sys.stderr)
+        return False
+
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=10)
+    args = parser.parse_args()
+
+    if not main(args.pages):
+        sys.exit(1)
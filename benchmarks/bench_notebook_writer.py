@@ -0,0 +1,196 @@
+"""
+Compare writing notebooks directly with nbformat against nbconvert's exporters.
+
+Usage
+-----
+    python benchmarks/bench_notebook_writer.py [--repeat N] [notebook ...]
+
+For each notebook (by default, every notebook under src/), and for a fixture
+notebook with outputs, this times two ways of doing the same work:
+
+    write   `writes_notebook` from make_reader_friendly_notebooks.py versus
+            `NotebookExporter().from_notebook_node`
+    clear   `clear_cell_outputs` + `writes_notebook` from clear_notebook_outputs.py
+            versus a `NotebookExporter` configured with `ClearOutputPreprocessor`
+
+The exporter output serves as the golden reference: if the direct path produces
+different text for any notebook, the difference is reported and the script exits
+with a nonzero status. The notebooks in src/ are kept without outputs, so the
+fixture, which has a stream, an execute_result, a display_data with a PNG image,
+and an error, checks that outputs are serialized identically too. nbconvert must
+be installed to run this benchmark.
+"""
+
+import argparse
+import base64
+import copy
+import pathlib
+import sys
+import time
+
+import nbformat
+from traitlets.config import Config
+from nbconvert.exporters import NotebookExporter
+from nbformat.v4 import (
+    new_code_cell, new_markdown_cell, new_notebook, new_output
+)
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import clear_notebook_outputs
+import make_reader_friendly_notebooks
+
+
+# the two implementations of each task
+# ======================================================================================
+
+def write_with_exporter(notebook):
+    notebook_code, resources = NotebookExporter().from_notebook_node(notebook)
+    return notebook_code
+
+
+def write_directly(notebook):
+    return make_reader_friendly_notebooks.writes_notebook(notebook)
+
+
+def clear_with_exporter(notebook):
+    c = Config()
+    c.NotebookExporter.preprocessors = ['nbconvert.preprocessors.ClearOutputPreprocessor']
+    notebook_code, resources = NotebookExporter(config=c).from_notebook_node(notebook)
+    return notebook_code
+
+
+def clear_directly(notebook):
+    notebook = copy.deepcopy(notebook)
+    clear_notebook_outputs.clear_cell_outputs(notebook)
+    return make_reader_friendly_notebooks.writes_notebook(notebook)
+
+
+TASKS = {
+    'write': (write_with_exporter, write_directly),
+    'clear': (clear_with_exporter, clear_directly),
+}
+
+
+# the fixture
+# ======================================================================================
+
+# a 1x1 PNG image
+PNG = base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f80f0000010101005d1bd2a20000000049454e44ae426082'
+)).decode()
+
+
+def make_fixture():
+    """Returns a notebook with one of each kind of output, as left by running it."""
+    return new_notebook(
+        cells=[
+            new_markdown_cell('# Outputs\n\nEach kind of output, with non-ASCII text: é ü 你好'),
+            new_code_cell(
+                'print("one")\nprint("two")',
+                execution_count=1,
+                outputs=[new_output('stream', name='stdout', text='one\ntwo\n')],
+            ),
+            new_code_cell(
+                'df',
+                execution_count=2,
+                metadata={'collapsed': False, 'scrolled': True},
+                outputs=[new_output(
+                    'execute_result', execution_count=2,
+                    data={
+                        'text/plain': '   a  b\n0  1  2',
+                        'text/html': '<table>\n<tr><td>1</td><td>2</td></tr>\n</table>',
+                    },
+                )],
+            ),
+            new_code_cell(
+                'plt.plot([1, 2])',
+                execution_count=3,
+                outputs=[new_output(
+                    'display_data',
+                    data={'image/png': PNG, 'text/plain': '<Figure size 432x288 with 1 Axes>'},
+                    metadata={'needs_background': 'light'},
+                )],
+            ),
+            new_code_cell(
+                '1 / 0',
+                execution_count=4,
+                outputs=[new_output(
+                    'error', ename='ZeroDivisionError', evalue='division by zero',
+                    traceback=['\x1b[0;31mZeroDivisionError\x1b[0m: division by zero'],
+                )],
+            ),
+        ],
+        metadata={
+            'kernelspec': {'display_name': 'Python 3', 'language': 'python', 'name': 'python3'},
+        },
+    )
+
+
+# timing
+# ======================================================================================
+
+def best_time(function, notebook, repeat):
+    """Returns the fastest of `repeat` calls along with the function's result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(notebook)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def read_notebooks(notebook_paths):
+    """Yields the name and contents of each notebook, and then of the fixture."""
+    for path in notebook_paths:
+        with path.open() as fileobj:
+            yield path, nbformat.read(fileobj, as_version=4)
+
+    # round-tripped, so that it is in the form nbformat.read produces
+    yield 'fixture with outputs', nbformat.reads(nbformat.writes(make_fixture()), as_version=4)
+
+
+def main(notebook_paths, repeat):
+    mismatches = []
+    totals = {task: [0., 0.] for task in TASKS}
+
+    n = 0
+    for path, notebook in read_notebooks(notebook_paths):
+        n += 1
+        for task, (reference, candidate) in TASKS.items():
+            reference_time, expected = best_time(reference, notebook, repeat)
+            candidate_time, actual = best_time(candidate, notebook, repeat)
+            totals[task][0] += reference_time
+            totals[task][1] += candidate_time
+
+            if actual != expected:
+                mismatches.append((task, path))
+
+    print(f'{n} notebooks, best of {repeat} runs each')
+    print(f'{"task":<8}{"exporter (ms/file)":>20}{"direct (ms/file)":>20}{"speedup":>10}')
+    for task, (reference_total, candidate_total) in totals.items():
+        print(
+            f'{task:<8}{1000 * reference_total / n:>20.2f}'
+            f'{1000 * candidate_total / n:>20.2f}'
+            f'{reference_total / candidate_total:>9.1f}x'
+        )
+
+    for task, path in mismatches:
+        print(f'MISMATCH ({task}): {path}', file=sys.stderr)
+
+    return not mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('notebooks', nargs='*', type=pathlib.Path)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    notebook_paths = args.notebooks or sorted(
+        make_reader_friendly_notebooks.find_notebooks(ROOT / 'src'))
+
+    if not main(notebook_paths, args.repeat):
+        sys.exit(1)
@@ -0,0 +1,182 @@
+"""
+Check that the tip lists are the same when the book is read in parallel.
+
+Usage
+-----
+    python benchmarks/bench_parallel_tips.py [--pages N] [--tips M] [--jobs J]
+
+Generates, in a temporary directory, a book of N pages with M `jupytertip`s
+each and a page listing them with `jupytertiplist`, and builds it with the
+extensions in extensions/ twice: serially, and with `sphinx -j J`. Under `-j`,
+each page is read in a separate process, and the tips it collects must be merged
+back into the main process to be listed.
+
+The tip list of each build must contain every tip, `Jupyter tip {j} on page {i}`,
+each followed by a link whose anchor exists on page{i}.html and marks that same
+tip; and the two lists must be identical. Otherwise the script exits with a
+nonzero status. Reports the time of each build.
+"""
+
+import argparse
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+# the book
+# ======================================================================================
+
+CONF = """
+extensions = ['myst_parser', 'jupytertips', 'admonitionlists']
+"""
+
+TIP = """\
+```{{jupytertip}}
+Jupyter tip {j} on page {i}: press `Shift+Enter` to run a cell.
+```
+"""
+
+TIP_PATTERN = re.compile(r'Jupyter tip (\d+) on page (\d+)')
+LINK_PATTERN = re.compile(r'href="([^"#]+\.html)#([^"]+)"')
+ID_PATTERN = re.compile(r'id="([^"]+)"')
+
+
+def make_book(directory, pages, tips):
+    directory.mkdir(parents=True)
+    (directory / 'conf.py').write_text(CONF)
+
+    page_names = [f'page{i}' for i in range(pages)]
+    toctree = '\n'.join(['```{toctree}', *page_names, 'tips', '```'])
+    (directory / 'index.md').write_text(f'# Book\n\n{toctree}\n')
+    (directory / 'tips.md').write_text('# Tips\n\n```{jupytertiplist}\n```\n')
+
+    for i, name in enumerate(page_names):
+        blocks = [f'# Page {i}\n'] + [TIP.format(i=i, j=j) for j in range(tips)]
+        (directory / f'{name}.md').write_text('\n'.join(blocks))
+
+
+def build(book, output, jobs):
+    """Builds the book as HTML, returning the wall time it took."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT / 'extensions'), os.environ.get('PYTHONPATH', '')]
+    ))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'sphinx', '-q', '-j', str(jobs),
+                    '-b', 'html', str(book), str(output)], env=env, check=True)
+    return time.perf_counter() - start
+
+
+# checking
+# ======================================================================================
+
+def read_tip_list(output):
+    """Reads the tips listed in tips.html, in order.
+
+    Returns
+    -------
+    List[Tuple[int, int, Optional[Tuple[str, str]]]]
+        The page and tip numbers of each tip, with the page and anchor of the
+        first link which follows it, or None if no link follows it.
+
+    """
+    html = (output / 'tips.html').read_text()
+    links = [(match.start(), match.groups()) for match in LINK_PATTERN.finditer(html)]
+
+    tip_list = []
+    for match in TIP_PATTERN.finditer(html):
+        j, i = map(int, match.groups())
+        link = next((link for position, link in links if position > match.end()), None)
+        tip_list.append((i, j, link))
+    return tip_list
+
+
+def find_anchor_text(html, anchor):
+    """Returns the HTML from an anchor up to the next element with an id, or None."""
+    match = re.search(f'id="{re.escape(anchor)}"', html)
+    if match is None:
+        return None
+
+    following = ID_PATTERN.search(html, match.end())
+    return html[match.end():following.start() if following else len(html)]
+
+
+def check_tip_list(output, tip_list, pages, tips):
+    """Checks that a tip list links to every tip in the book.
+
+    Returns
+    -------
+    List[str]
+        A description of each problem found.
+
+    """
+    problems = []
+    links = {(i, j): link for i, j, link in tip_list}
+
+    for i in range(pages):
+        for j in range(tips):
+            tip = f'Jupyter tip {j} on page {i}'
+            if (i, j) not in links:
+                problems.append(f'{tip}: not listed')
+                continue
+
+            if links[i, j] is None:
+                problems.append(f'{tip}: no link follows it')
+                continue
+
+            page, anchor = links[i, j]
+            if page != f'page{i}.html':
+                problems.append(f'{tip}: links to {page}')
+                continue
+
+            text = find_anchor_text((output / page).read_text(), anchor)
+            if text is None:
+                problems.append(f'{tip}: #{anchor} not found in {page}')
+            elif tip not in text:
+                problems.append(f'{tip}: #{anchor} in {page} marks another tip')
+
+    return problems
+
+
+def main(pages, tips, jobs):
+    problems = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        book = pathlib.Path(workdir) / 'book'
+        make_book(book, pages, tips)
+
+        tip_lists = {}
+        for n in sorted({1, jobs}):
+            output = pathlib.Path(workdir) / f'build_j{n}'
+            seconds = build(book, output, n)
+            print(f'{pages} pages of {tips} tips built with -j {n} in {seconds:.2f} s')
+
+            tip_lists[n] = read_tip_list(output)
+            problems.extend(
+                f'-j {n}: {problem}'
+                for problem in check_tip_list(output, tip_lists[n], pages, tips)
+            )
+
+    if tip_lists[1] != tip_lists[jobs]:
+        problems.append(f'-j {jobs}: the tip list differs from that of -j 1')
+
+    for problem in problems:
+        print(f'MISMATCH: {problem}', file=sys.stderr)
+
+    return not problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--tips', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=4)
+    args = parser.parse_args()
+
+    if not main(args.pages, args.tips, args.jobs):
+        sys.exit(1)
@@ -0,0 +1,125 @@
+"""
+Measure how much of the notes the parse cache reuses, and what it saves.
+
+Usage
+-----
+    python benchmarks/bench_parsecache.py [--pages]
+
+Copies src/ to a temporary directory and builds it as HTML from scratch twice,
+as `scripts/watch.py` would, with `parsecache` on and off. The notebooks are
+not executed, as the outputs make no difference to what is parsed. Each build
+runs in a fresh interpreter, which must have jupyter-book installed.
+
+Reports the time of each build, and the number of directives whose content the
+cache reused (hits), parsed and kept or parsed once (misses), and parsed every
+time because it cannot be reused (uncacheable); with `--pages`, also for each
+page. The body of every page must be the same in both builds, or the script exits
+with a nonzero status.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+OUTCOMES = ['hit', 'miss', 'uncacheable']
+
+# the main content of a page, without the navigation, which lists every page
+BODY_PATTERN = re.compile(r'<main.*?</main>', re.DOTALL)
+
+# run in a fresh interpreter, with the root of the copy and 0 or 1 as arguments
+CHILD = """
+import contextlib, json, sys, time
+import watch
+
+with contextlib.ExitStack() as stack:
+    app = watch.create_application(stack, freshenv=True, root=watch.pathlib.Path(sys.argv[1]))
+    app.config.jupyter_execute_notebooks = 'off'
+    app.config.parsecache = bool(int(sys.argv[2]))
+    start = time.perf_counter()
+    app.build()
+    seconds = time.perf_counter() - start
+    stats = getattr(app.env, 'parsecache_stats', {})
+
+print(json.dumps({'seconds': seconds, 'stats': stats}))
+"""
+
+
+def build(root, parsecache):
+    """Builds the copy of the notes in `root`, returning the time and the counts."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT / 'extensions'), str(ROOT / 'scripts'), os.environ.get('PYTHONPATH', '')]
+    ))
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, str(root), str(int(parsecache))],
+        env=env, check=True, stdout=subprocess.PIPE,
+    ).stdout.decode()
+    # the build's own output comes first
+    return json.loads(output.splitlines()[-1])
+
+
+def read_bodies(output):
+    """Maps each page in the HTML output to the body of the page."""
+    bodies = {}
+    for path in sorted(output.rglob('*.html')):
+        match = BODY_PATTERN.search(path.read_text())
+        bodies[path.relative_to(output).as_posix()] = match.group() if match else None
+    return bodies
+
+
+def print_counts(name, by_outcome):
+    print(f'{name:<48}' + ''.join(f'{by_outcome.get(outcome, 0):>12}' for outcome in OUTCOMES))
+
+
+def main(pages):
+    bodies = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for parsecache in [True, False]:
+            root = pathlib.Path(workdir) / f'parsecache_{"on" if parsecache else "off"}'
+            shutil.copytree(ROOT / 'src', root / 'src',
+                            ignore=shutil.ignore_patterns('_build', '.ipynb_checkpoints'))
+
+            result = build(root, parsecache)
+            print(f'parsecache = {parsecache}: built in {result["seconds"]:.2f} s')
+            bodies[parsecache] = read_bodies(root / 'src' / '_build' / 'html')
+
+            if parsecache:
+                stats = result['stats']
+
+    totals = {outcome: 0 for outcome in OUTCOMES}
+    for by_outcome in stats.values():
+        for outcome, n in by_outcome.items():
+            totals[outcome] += n
+
+    print()
+    print(f'{"":<48}' + ''.join(f'{outcome:>12}' for outcome in OUTCOMES))
+    if pages:
+        for docname in sorted(stats):
+            print_counts(docname, stats[docname])
+    print_counts('total', totals)
+
+    mismatches = sorted(
+        page for page in bodies[True].keys() | bodies[False].keys()
+        if bodies[True].get(page) != bodies[False].get(page)
+    )
+    for page in mismatches:
+        print(f'MISMATCH: {page} differs with parsecache off', file=sys.stderr)
+
+    return not mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', action='store_true')
+    args = parser.parse_args()
+
+    if not main(args.pages):
+        sys.exit(1)
@@ -0,0 +1,128 @@
+"""
+Measure the time to import and set up the extensions.
+
+Usage
+-----
+    python benchmarks/bench_startup.py [--repeat N] [--budget-ms B]
+
+In a fresh interpreter run with `python -X importtime`, creates a Sphinx
+application with no extensions, so that Sphinx itself is already imported, and
+then imports `notesextensions` and every extension it sets up, and calls its
+`setup`. Reports the import time of each module this pulls in, as measured by
+`-X importtime`, and the total time from the first import to the end of `setup`.
+
+This is repeated N (by default 5) times, and the best run is reported. If its
+total time exceeds B milliseconds (by default 25), the script exits with a
+nonzero status.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'extensions'))
+
+import notesextensions
+
+
+# separates the imports of Sphinx from those of the extensions in the output
+MARKER = '--- extensions ---'
+
+# run in the fresh interpreter, with the temporary source directory as argv[1]
+CHILD = f"""
+import sys, json, time
+from sphinx.application import Sphinx
+
+srcdir = sys.argv[1]
+app = Sphinx(srcdir, srcdir, srcdir + '/_build', srcdir + '/_build/.doctrees',
+             'html', status=None, warning=None)
+
+print({MARKER!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+{chr(10).join(f'import {name}' for name in notesextensions.EXTENSIONS)}
+import notesextensions
+imported = time.perf_counter()
+app.setup_extension('notesextensions')
+finished = time.perf_counter()
+
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'setup_ms': (finished - imported) * 1000,
+    'total_ms': (finished - start) * 1000,
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns the self and cumulative import times, in milliseconds, of the
+    top-level modules imported after the marker, in the order imported.
+    """
+    lines = stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+
+    times = {}
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if self_us.strip() == 'self [us]':
+            continue
+        # nested imports are indented under the module that imported them
+        if name.startswith(' ' * 3):
+            continue
+        times[name.strip()] = {
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        }
+    return times
+
+
+def measure():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT / 'extensions'), os.environ.get('PYTHONPATH', '')]
+    ))
+
+    with tempfile.TemporaryDirectory() as srcdir:
+        (pathlib.Path(srcdir) / 'conf.py').write_text('')
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD, srcdir],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+
+    result = json.loads(process.stdout.decode().strip().splitlines()[-1])
+    result['modules'] = parse_importtime(process.stderr.decode())
+    return result
+
+
+def main(args):
+    # as in a real build, the extensions are loaded from bytecode, even where
+    # PYTHONDONTWRITEBYTECODE is set
+    compileall.compile_dir(str(ROOT / 'extensions'), quiet=1)
+
+    runs = [measure() for _ in range(args.repeat)]
+    best = min(runs, key=lambda run: run['total_ms'])
+
+    for name, times in best['modules'].items():
+        print(f'{name:<32}{times["self_ms"]:>10.2f} ms{times["cumulative_ms"]:>10.2f} ms')
+    print()
+    print(f'{"import":<32}{best["import_ms"]:>10.2f} ms')
+    print(f'{"setup":<32}{best["setup_ms"]:>10.2f} ms')
+    print(f'{"total":<32}{best["total_ms"]:>10.2f} ms   (budget {args.budget_ms} ms)')
+
+    if best['total_ms'] > args.budget_ms:
+        print(f'over budget by {best["total_ms"] - args.budget_ms:.2f} ms', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=25)
+    main(parser.parse_args())
@@ -0,0 +1,341 @@
+"""
+Time the build of a synthetic book, and the notebook scripts, end-to-end.
+
+Usage
+-----
+    python benchmarks/run_benchmarks.py [--pages N] [--tips M] [--dterms K]
+        [--answers K] [--notebooks N] [--output-kb S] [--jobs J] [--repeat R]
+        [--output results.json] [--compare baseline.json]
+
+Generates, in a temporary directory, a book of N pages. Each page has M
+`jupytertip`s, K `dterm`s, and K `hiddenanswer`s, with a glossary and a page of
+tip lists, built with the extensions in extensions/. It also generates N
+notebooks containing the same directives and code cells with S kilobytes of
+output each. Then it times:
+
+- a full Sphinx HTML build of the book, serially and with J processes
+- an incremental rebuild after one page is edited
+- make_reader_friendly_notebooks.py, from scratch and incrementally
+- clear_notebook_outputs.py
+
+Everything runs as a subprocess of the current interpreter, which must have
+Sphinx, myst-parser, and sphinx-tabs installed; nothing is downloaded, and the
+notebooks are never executed.
+
+The results, along with the parameters, the git commit, and the versions of
+Python and Sphinx, are written as JSON to `--output` (by default,
+benchmarks/results/<commit>.json). Passing the results of an earlier run with
+`--compare` prints the ratio of each time to the earlier one.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import nbformat
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+# the synthetic book
+# ======================================================================================
+
+GLOSSARY_TERMS = [
+    'array', 'boolean', 'dataframe', 'float', 'index', 'integer', 'method chaining',
+    'query', 'series', 'string',
+]
+
+CONF = """
+extensions = [
+    'myst_parser',
+    'sphinx_tabs.tabs',
+    'jupyterhublink',
+    'hiddenanswer',
+    'dterms',
+    'jupytertips',
+    'admonitionlists',
+]
+admonitionlists_lazy = True
+jupyterhub_url = 'https://hub.example.com'
+jupyterhub_repository_url = 'https://github.com/example/notes'
+"""
+
+TIP = """\
+```{{jupytertip}}
+Jupyter tip {j} on page {i}: press `Shift+Enter` to run a cell.
+```
+"""
+
+ANSWER = """\
+````{{hiddenanswer}}
+---
+question: |
+    How would you make an array of the first {j} powers of 2?
+answer: |
+    ```python
+    2**np.arange({j})
+    ```
+````
+"""
+
+CODE = """\
+import numpy as np
+2**np.arange({j})
+"""
+
+
+def dterm(j):
+    term = GLOSSARY_TERMS[j % len(GLOSSARY_TERMS)]
+    # exercise the plural forms, too
+    return f'{{dterm}}`{term}s <{term}>`' if j % 2 else f'{{dterm}}`{term}`'
+
+
+def make_page(i, tips, dterms, answers):
+    blocks = [f'# Page {i}\n']
+
+    blocks.append(' '.join(
+        f'A sentence mentioning {dterm(j)}.' for j in range(dterms)
+    ) + '\n')
+
+    blocks.extend(TIP.format(i=i, j=j) for j in range(tips))
+    blocks.extend(ANSWER.format(j=j) for j in range(answers))
+    blocks.append(f'```{{jupyterhublink}} notebooks/page{i}.ipynb\n```\n')
+
+    return '\n'.join(blocks)
+
+
+def make_glossary():
+    definitions = [f'{term}\n    The definition of {term}.\n' for term in GLOSSARY_TERMS]
+    return '# Glossary\n\n```{glossary}\n' + '\n'.join(definitions) + '```\n'
+
+
+def make_book(directory, pages, tips, dterms, answers):
+    directory.mkdir(parents=True)
+    (directory / 'conf.py').write_text(CONF)
+
+    page_names = [f'page{i}' for i in range(pages)]
+    toctree = '\n'.join(['```{toctree}', *page_names, 'glossary', 'tips', '```'])
+    (directory / 'index.md').write_text(f'# Synthetic Book\n\n{toctree}\n')
+
+    (directory / 'glossary.md').write_text(make_glossary())
+    (directory / 'tips.md').write_text('# Tips\n\n```{jupytertiplist}\n```\n')
+
+    for i, name in enumerate(page_names):
+        (directory / f'{name}.md').write_text(make_page(i, tips, dterms, answers))
+
+
+def make_notebook(i, tips, answers, output_kb):
+    cells = [nbformat.v4.new_markdown_cell(f'# Notebook {i}')]
+
+    for j in range(tips):
+        cells.append(nbformat.v4.new_markdown_cell(TIP.format(i=i, j=j)))
+
+    for j in range(answers):
+        cells.append(nbformat.v4.new_markdown_cell(ANSWER.format(j=j)))
+
+        cell = nbformat.v4.new_code_cell(CODE.format(j=j), execution_count=j + 1)
+        line = 'x' * 99 + '\n'
+        cell['outputs'] = [nbformat.v4.new_output(
+            'stream', name='stdout', text=line * (output_kb * 1024 // len(line))
+        )]
+        cells.append(cell)
+
+    cells[-1]['metadata']['tags'] = ['hide-from-reader']
+    return nbformat.v4.new_notebook(cells=cells)
+
+
+def make_notebooks(directory, notebooks, tips, answers, output_kb):
+    directory.mkdir(parents=True)
+    for i in range(notebooks):
+        notebook = make_notebook(i, tips, answers, output_kb)
+        with (directory / f'page{i}.ipynb').open('w') as fileobj:
+            nbformat.write(notebook, fileobj)
+
+
+# timing
+# ======================================================================================
+
+def run(args, cwd=None):
+    """Runs a command, returning the wall time it took."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT / 'extensions'), os.environ.get('PYTHONPATH', '')]
+    ))
+    start = time.perf_counter()
+    try:
+        subprocess.run(args, cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as exc:
+        # a successful run's warnings are discarded, but not a failed run's errors
+        sys.stderr.write(exc.stderr.decode(errors='replace'))
+        raise
+    return time.perf_counter() - start
+
+
+def best_of(repeat, setup, command):
+    """Runs `setup` and then times `command`, `repeat` times."""
+    times = []
+    for _ in range(repeat):
+        setup()
+        times.append(command())
+    return {'best_s': min(times), 'times_s': times}
+
+
+def benchmark_book(workdir, args):
+    book = workdir / 'book'
+    build = workdir / 'book_build'
+    make_book(book, args.pages, args.tips, args.dterms, args.answers)
+
+    def sphinx(*extra):
+        return lambda: run([sys.executable, '-m', 'sphinx', '-q', *extra,
+                            '-b', 'html', str(book), str(build)])
+
+    def clean():
+        shutil.rmtree(build, ignore_errors=True)
+
+    edited = book / 'page0.md'
+    original = edited.read_text()
+
+    def edit():
+        # keep the build, but change a page, as an author would
+        sphinx()()
+        edited.write_text(original + f'\nEdited at {time.time()}.\n')
+
+    results = {
+        'sphinx_full': best_of(args.repeat, clean, sphinx()),
+        f'sphinx_full_j{args.jobs}': best_of(args.repeat, clean, sphinx('-j', str(args.jobs))),
+        'sphinx_incremental': best_of(args.repeat, edit, sphinx()),
+    }
+    edited.write_text(original)
+    return results
+
+
+def benchmark_notebooks(workdir, args):
+    src = workdir / 'notebooks_src'
+    make_notebooks(src, args.notebooks, args.tips, args.answers, args.output_kb)
+
+    dst = workdir / 'notebooks_dst'
+    manifest = workdir / 'manifest.json'
+    script = str(ROOT / 'scripts' / 'make_reader_friendly_notebooks.py')
+
+    def clean():
+        shutil.rmtree(dst, ignore_errors=True)
+        dst.mkdir()
+        if manifest.exists():
+            manifest.unlink()
+
+    def make(*extra):
+        return lambda: run([sys.executable, script, *extra, str(src)], cwd=dst)
+
+    def edit():
+        # build everything, then change one notebook's source
+        clean()
+        make('--manifest', str(manifest))()
+        path = src / 'page0.ipynb'
+        notebook = nbformat.read(str(path), as_version=4)
+        notebook['cells'][0]['source'] = f'# Notebook 0, edited at {time.time()}'
+        nbformat.write(notebook, str(path))
+
+    cleared = workdir / 'notebooks_cleared'
+
+    def copy():
+        shutil.rmtree(cleared, ignore_errors=True)
+        shutil.copytree(src, cleared)
+
+    clear = lambda: run([sys.executable, str(ROOT / 'scripts' / 'clear_notebook_outputs.py'),
+                         '--jobs', str(args.jobs)], cwd=cleared)
+
+    return {
+        'reader_friendly_full': best_of(args.repeat, clean, make()),
+        f'reader_friendly_full_j{args.jobs}': best_of(
+            args.repeat, clean, make('--jobs', str(args.jobs))),
+        'reader_friendly_stream': best_of(args.repeat, clean, make('--stream')),
+        'reader_friendly_incremental': best_of(
+            args.repeat, edit, make('--manifest', str(manifest))),
+        f'clear_outputs_j{args.jobs}': best_of(args.repeat, copy, clear),
+    }
+
+
+# results
+# ======================================================================================
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def sphinx_version():
+    output = subprocess.run([sys.executable, '-m', 'sphinx', '--version'],
+                            stdout=subprocess.PIPE, check=True).stdout.decode()
+    return output.split()[-1]
+
+
+def print_results(results, baseline=None):
+    for name, result in results.items():
+        line = f'{name:<32}{result["best_s"]:>10.3f} s'
+        if baseline is not None and name in baseline:
+            line += f'{result["best_s"] / baseline[name]["best_s"]:>10.2f}x'
+        print(line)
+
+
+def main(args):
+    parameters = {
+        name: getattr(args, name)
+        for name in ['pages', 'tips', 'dterms', 'answers', 'notebooks', 'output_kb',
+                     'jobs', 'repeat']
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        results = benchmark_book(workdir, args)
+        results.update(benchmark_notebooks(workdir, args))
+
+    report = {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'sphinx': sphinx_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'parameters': parameters,
+        'results': results,
+    }
+
+    output = args.output or ROOT / 'benchmarks' / 'results' / f'{report["commit"]}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open('w') as fileobj:
+        json.dump(report, fileobj, indent=2)
+
+    baseline = None
+    if args.compare is not None:
+        with args.compare.open() as fileobj:
+            baseline = json.load(fileobj)['results']
+
+    print(f'commit {report["commit"]}, best of {args.repeat} runs, written to {output}')
+    print_results(results, baseline)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--tips', type=int, default=3)
+    parser.add_argument('--dterms', type=int, default=10)
+    parser.add_argument('--answers', type=int, default=10)
+    parser.add_argument('--notebooks', type=int, default=50)
+    parser.add_argument('--output-kb', type=int, default=64)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=pathlib.Path)
+    parser.add_argument('--compare', type=pathlib.Path)
+    main(parser.parse_args())
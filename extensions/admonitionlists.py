@@ -9,9 +9,41 @@
 #      to a variable in the Builder environment.
 # 3. Create and register the class for the list directive
 # 
-# Then we connect Process and Purge functions to the app, just like in the
-# Sphinx TodoList tutorial.
+# Then we connect Process, Purge, and Merge functions to the app, just like in
+# the Sphinx TodoList tutorial.
 # https://www.sphinx-doc.org/en/master/development/tutorials/todo.html
+#
+# The Merge function is what makes the extension safe for parallel reads: with
+# `sphinx -j N`, each reader process collects the admonitions of the documents
+# it reads into its own copy of the environment, and these must be merged back
+# into the main environment or they are lost.
+#
+# Unlike the tutorial, the admonitions are not kept in a flat list. Instead,
+# each `env.<admnname>list` is an AdmonitionRegistry which indexes them by
+# docname, so purging or merging a document only touches that document's
+# entries rather than scanning every admonition in the project.
+#
+# Each list node is replaced by a copy of every admonition, each followed by a
+# link to it. The stored admonition nodes themselves are never put into a
+# doctree, so that one page's writer cannot change what another page lists.
+#
+# Lazy Mode
+# ---------
+#
+# By default, each admonition is stored in the registry along with a copy of
+# its node, taken from the doctree once the document has been read, so every
+# admonition in the project is pickled into the environment even if no list
+# directive is ever used. With `admonitionlists_lazy = True`, only a compact
+# reference is stored: the docname, line number, and target id. The node is
+# copied out of the document's pickled doctree, which is the same read doctree,
+# only when a list is actually being resolved; so both modes list the same
+# nodes. The copies from a document are kept until that document changes, so
+# that a process which builds several times (see `scripts/watch.py`) only reads
+# the doctrees of the documents read again.
+#
+# Either way, the copies are taken before references are resolved, so the
+# references in each copy are resolved for the page it is listed on, as
+# `sphinx.ext.todo` does.
 # 
 
 # Explanation Of Generalized Admonition Lists
@@ -59,16 +91,154 @@ from docutils import nodes
 from docutils.parsers.rst import directives
 from docutils.parsers.rst import Directive
 
-from jupytertips import JupyterTip
-
+from sphinx import addnodes
 from sphinx.locale import _
-from sphinx.util.docutils import SphinxDirective
+from sphinx.util import docname_join
+from sphinx.util.docutils import SphinxDirective, new_document
 
 from sphinx.util import logging
 logger = logging.getLogger(__name__)
 
 
 
+class AdmonitionRegistry:
+    """
+    The admonitions of one type collected from all documents, keyed by docname.
+
+    Iterating over the registry yields every admonition in a stable global
+    order: by docname, and within a document, in the order they were added.
+    This is the order in which a full, serial build would have collected them.
+    """
+
+    def __init__(self):
+        self._admonitions = {}
+        self._docname_order = None
+        self._materialized = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_materialized'] = {}
+        return state
+
+    def _changed(self, docname, docname_order_changed):
+        # only the nodes copied from the document itself are out of date
+        self._materialized.pop(docname, None)
+        if docname_order_changed:
+            self._docname_order = None
+
+    def add(self, admonition):
+        docname = admonition['docname']
+        is_new_docname = docname not in self._admonitions
+        self._admonitions.setdefault(docname, []).append(admonition)
+        self._changed(docname, is_new_docname)
+
+    def purge(self, docname):
+        if self._admonitions.pop(docname, None) is not None:
+            self._changed(docname, True)
+
+    def merge(self, other, docnames):
+        """Takes the admonitions of the given documents from another registry."""
+        for docname in docnames:
+            if docname in other._admonitions:
+                self._admonitions[docname] = other._admonitions[docname]
+                self._changed(docname, True)
+
+    def store_nodes(self, docname, doctree):
+        """
+        Stores a copy of the node of each of the document's admonitions with
+        the admonition itself, from the document's doctree.
+        """
+        admonitions = self._admonitions.get(docname, [])
+        materialized = materialize_admonition_nodes(
+            doctree, [admn_info['target_id'] for admn_info in admonitions]
+        )
+        for admn_info in admonitions:
+            if admn_info['target_id'] in materialized:
+                admn_info['node'] = materialized[admn_info['target_id']]
+
+    def get_node(self, env, admonition):
+        """
+        Returns the node of the admonition. In lazy mode, the node is copied
+        from the document's doctree the first time it is needed.
+
+        If the admonition's target is no longer in the doctree, e.g. because
+        a transform removed it, a warning is logged and None is returned.
+        """
+        if 'node' in admonition:
+            return admonition['node']
+
+        docname = admonition['docname']
+        if docname not in self._materialized:
+            self._materialized[docname] = materialize_admonition_nodes(
+                env.get_doctree(docname),
+                [admn_info['target_id'] for admn_info in self._admonitions[docname]]
+            )
+
+        node = self._materialized[docname].get(admonition['target_id'])
+        if node is None:
+            logger.warning(
+                f"admonitionlists: {admonition['target_id']!r} is not in the "
+                f"doctree of {docname!r}, so it is left out of the list",
+                location=(docname, admonition['lineno'])
+            )
+        return node
+
+    def docnames(self):
+        return self._admonitions.keys()
+
+    def __iter__(self):
+        if self._docname_order is None:
+            self._docname_order = sorted(self._admonitions)
+        for docname in self._docname_order:
+            yield from self._admonitions[docname]
+
+    def __len__(self):
+        return sum(len(admonitions) for admonitions in self._admonitions.values())
+
+def materialize_admonition_nodes(doctree, target_ids):
+    """
+    Copies the admonition nodes following the targets with these ids out of
+    a doctree. Returns a dict mapping each target id to its admonition's copy.
+    """
+
+    wanted = set(target_ids)
+    materialized = {}
+
+    for node in doctree.traverse(nodes.Element):
+        found = wanted.intersection(node['ids'])
+        if not found:
+            continue
+        target_id = found.pop()
+
+        # the target's id is usually moved onto the admonition itself by the
+        # PropagateTargets transform; if not, the admonition follows the target
+        if isinstance(node, nodes.target):
+            node = node.next_node(descend=False, siblings=True)
+
+        admonition_node = node.deepcopy()
+        admonition_node['ids'] = [
+            node_id for node_id in admonition_node['ids'] if node_id != target_id
+        ]
+        materialized[target_id] = admonition_node
+
+    return materialized
+
+def get_admonition_registry(env, admnlist_name):
+    """
+    Returns the registry stored in the environment under this name, creating
+    it if needed.
+    """
+
+    if not hasattr(env, admnlist_name):
+        setattr(env, admnlist_name, AdmonitionRegistry())
+    return getattr(env, admnlist_name)
+
+
+
+# maps the name of each list directive to its list node class, once set up
+LIST_NODES = {}
+
+
 class generic_list_node(nodes.General, nodes.Element):
     pass
 
@@ -103,15 +273,13 @@ def generic_extended_run(Admonition):
         target_id = f"{admn_name}-%d" % self.env.new_serialno(admn_name)
         target_node = nodes.target('', '', ids=[target_id])
 
-        if not hasattr(self.env, admnlist_name):
-            setattr(self.env, admnlist_name, [])
-
-        getattr(self.env, admnlist_name).append({
+        admonition = {
             'docname': self.env.docname,
             'lineno': self.lineno,
-            'node': admonition_node.deepcopy(),
-            'target': target_node,
-        })
+            'target_id': target_id,
+        }
+
+        get_admonition_registry(self.env, admnlist_name).add(admonition)
 
         return [target_node, admonition_node]
 
@@ -159,6 +327,65 @@ def create_list_directive(Admonition, list_node):
 
 
 
+def build_admonition_list_content(app, registry, fromdocname):
+    """
+    Builds the nodes which a list node on the page `fromdocname` is replaced
+    with: a copy of each admonition in the registry, followed by a link to it.
+    """
+
+    env = app.builder.env
+    content = []
+
+    for admn_info in registry:
+        admonition_node = registry.get_node(env, admn_info)
+        if admonition_node is None:
+            continue
+        admonition_node = admonition_node.deepcopy()
+        resolve_references(app, admonition_node, fromdocname)
+
+        para = nodes.paragraph()
+        description = (
+            _('(The original entry can be found ')
+        )
+        para += nodes.Text(description, description)
+
+        # Create a reference
+        newnode = nodes.reference('', '')
+        innernode = nodes.emphasis(_('here'), _('here'))
+        newnode['refdocname'] = admn_info['docname']
+        newnode['refuri'] = app.builder.get_relative_uri(
+            fromdocname, admn_info['docname'])
+        newnode['refuri'] += '#' + admn_info['target_id']
+        newnode.append(innernode)
+        para += newnode
+        para += nodes.Text('.)', '.)')
+
+        content.append(admonition_node)
+        content.append(para)
+
+    return content
+
+def resolve_references(app, node, fromdocname):
+    """
+    Resolves the references in a copy of an admonition, for the page
+    `fromdocname` it is listed on. The node must be wrapped in a document for
+    the post-transforms which resolve them.
+    """
+
+    for xref in node.traverse(addnodes.pending_xref):
+        if 'refdoc' not in xref:
+            continue
+        # a document is named relative to the page it is named on
+        if xref.get('reftype') == 'doc':
+            xref['reftarget'] = '/' + docname_join(xref['refdoc'], xref['reftarget'])
+        # the resolver links from the refdoc, which is now the listing page
+        xref['refdoc'] = fromdocname
+
+    document = new_document('')
+    document += node
+    app.builder.env.resolve_references(document, fromdocname, app.builder)
+    document.remove(node)
+
 def generic_process_admonition_list_nodes(admonitions, list_nodes):
     """
     A closure so that the process_admonition_list_nodes can handle all supported
@@ -191,39 +418,38 @@ def generic_process_admonition_list_nodes(admonitions, list_nodes):
             admn_name = Admonition.__name__.lower()
             admnlist_name = admn_name + 'list'
 
-            if not hasattr(env, admnlist_name):
-                setattr(env, admnlist_name, [])
+            registry = get_admonition_registry(env, admnlist_name)
 
             for node in doctree.traverse(list_node):
-                content = []
-
-                for admn_info in getattr(env, admnlist_name):
-                    para = nodes.paragraph()
-                    filename = env.doc2path(admn_info['docname'], base=None)
-                    description = (
-                        _('(The original entry can be found ')
-                    )
-                    para += nodes.Text(description, description)
-
-                    # Create a reference
-                    newnode = nodes.reference('', '')
-                    innernode = nodes.emphasis(_('here'), _('here'))
-                    newnode['refdocname'] = admn_info['docname']
-                    newnode['refuri'] = app.builder.get_relative_uri(
-                        fromdocname, admn_info['docname'])
-                    newnode['refuri'] += '#' + admn_info['target']['refid']
-                    newnode.append(innernode)
-                    para += newnode
-                    para += nodes.Text('.)', '.)')
-
-                    # Insert the copied node onto the page
-                    content.append(admn_info['node'])
-                    content.append(para)
-
-                node.replace_self(content)
+                node.replace_self(build_admonition_list_content(app, registry, fromdocname))
 
     return process_admonition_list_nodes
 
+def generic_store_admonition_nodes(admonitions):
+    """
+    A closure so that the store_admonition_nodes can handle all supported
+    Admonition classes.
+    """
+
+    def store_admonition_nodes(app, doctree):
+        """
+        Unless in lazy mode, stores a copy of each admonition of the document
+        just read, from its doctree, with the admonition in the registry.
+        """
+
+        if app.config.admonitionlists_lazy:
+            return
+
+        for Admonition in admonitions:
+
+            admnlist_name = Admonition.__name__.lower() + 'list'
+
+            get_admonition_registry(app.env, admnlist_name).store_nodes(
+                app.env.docname, doctree
+            )
+
+    return store_admonition_nodes
+
 def generic_purge_admonition_lists(admonitions):
     """
     A closure so that the purge_admonition_list_nodes can handle all supported
@@ -236,17 +462,42 @@ def generic_purge_admonition_lists(admonitions):
 
             admnlist_name = Admonition.__name__.lower() + 'list'
 
-            if hasattr(env, admnlist_name):
-                setattr(env, admnlist_name, [
-                    admonition for admonition in getattr(env, admnlist_name)
-                    if admonition['docname'] != docname
-                ])
+            get_admonition_registry(env, admnlist_name).purge(docname)
 
     return purge_admonition_lists
 
+def generic_merge_admonition_lists(admonitions):
+    """
+    A closure so that the merge_admonition_lists can handle all supported
+    Admonition classes.
+    """
+
+    def merge_admonition_lists(app, env, docnames, other):
+        """
+        Merges the admonitions collected by a parallel reader process from the
+        documents in `docnames` into the main environment.
+        """
+
+        for Admonition in admonitions:
+
+            admnlist_name = Admonition.__name__.lower() + 'list'
+
+            # the reader process started from a copy of the main environment, so
+            # its registry also contains admonitions of documents it did not read
+            get_admonition_registry(env, admnlist_name).merge(
+                get_admonition_registry(other, admnlist_name), docnames
+            )
+
+    return merge_admonition_lists
+
 
 
 def setup(app):
+    # the jupytertip directive is extended below, so it must be registered first
+    app.setup_extension('jupytertips')
+    from jupytertips import JupyterTip
+
+    app.add_config_value('admonitionlists_lazy', False, 'env')
 
     SUPPORTED_ADMONITIONS = [
         JupyterTip,
@@ -260,6 +511,7 @@ def setup(app):
         list_node = create_list_node(Admonition)
         list_nodes.append(list_node)
         globals()[Admonition.__name__.lower()+'list_node'] = list_node
+        LIST_NODES[Admonition.__name__.lower()+'list'] = list_node
         app.add_node(list_node)
         # print(f"""
         # ***********
@@ -276,6 +528,10 @@ def setup(app):
         app.add_directive(Admonition.__name__.lower()+'list', list_directive)
 
 
+    app.connect(
+        'doctree-read',
+        generic_store_admonition_nodes(SUPPORTED_ADMONITIONS)
+    )
     app.connect(
         'doctree-resolved',
         generic_process_admonition_list_nodes(SUPPORTED_ADMONITIONS, list_nodes)
@@ -284,10 +540,15 @@ def setup(app):
         'env-purge-doc',
         generic_purge_admonition_lists(SUPPORTED_ADMONITIONS)
     )
+    app.connect(
+        'env-merge-info',
+        generic_merge_admonition_lists(SUPPORTED_ADMONITIONS)
+    )
 
 
     return {
         'version': '0.1',
+        'env_version': 3,
         'parallel_read_safe': True,
         'parallel_write_safe': True,
     }
@@ -0,0 +1,307 @@
+"""Records which pages depend on which files and pages, and rebuilds exactly those.
+
+Use
+---
+
+Set up by `notesextensions`. After each build, the graph is written to
+`dependencies.json` and `dependencies.dot` next to the builder's output
+directory, i.e. `src/_build/`. Along with each page's dependencies, the JSON
+report gives the reason each page was read or written again by that build.
+
+"""
+
+# General Logic
+# -------------
+#
+# Sphinx reads a page again when its source changes, or when a file noted with
+# `env.note_dependency` changes; and writes a page again only if it was read. The
+# pages of these notes also depend on one another in ways Sphinx cannot see:
+#
+# 1. A notebook depends on the data sets its code reads. When a page is read, the
+#    string literals in its code which name existing data files are noted as
+#    dependencies, so Sphinx reads the page again when one of them changes. The
+#    execution cache only notices changes to the code, so the notebook's outputs
+#    are discarded, using the graph written below, by `scripts/execute_notebooks.py`.
+#
+# 2. A page which uses `dterm` depends on the glossary, which decides which terms
+#    are known and where they link. Each dterm node carries the term as written,
+#    and the terms used on each page are recorded. At `env-get-outdated`, the
+#    glossary index is compared with the one from the last build, and only the
+#    pages using a term whose entry changed are read again. Editing a definition,
+#    or adding an unused term, reads nothing again.
+#
+# 3. A page with a `jupytertiplist` or `tiplist` depends on every page with a tip,
+#    but the list is only filled in when the page is written. At `env-get-updated`,
+#    the pages which had or have entries in an admonitionlists registry are
+#    compared with the pages read or removed, and if any are in both, the pages
+#    with that kind of list are written again.
+#
+# The graph is kept in the environment, indexed by docname, and purged and merged
+# like the admonitionlists registries, so that it is correct after incremental
+# and parallel builds.
+
+from docutils import nodes
+
+from sphinx.util import logging
+
+import json
+import os
+import pathlib
+import re
+
+logger = logging.getLogger(__name__)
+
+# a string literal naming a file with one of these extensions
+DATA_FILE = re.compile(r'''(['"])([^'"\n]+\.(?:csv|tsv|json|txt|npy|xlsx?))\1''')
+
+
+# the graph
+# ---------
+
+def get_graph(env):
+    if not hasattr(env, 'dependencygraph'):
+        env.dependencygraph = {}
+    return env.dependencygraph
+
+
+def read_code(source_path):
+    """Returns the code of a notebook, or the whole text of any other page."""
+    text = source_path.read_text(encoding='utf-8')
+    if source_path.suffix != '.ipynb':
+        return text
+
+    cells = json.loads(text).get('cells', [])
+    return '\n'.join(
+        ''.join(cell['source']) if isinstance(cell['source'], list) else cell['source']
+        for cell in cells if cell.get('cell_type') == 'code'
+    )
+
+
+def find_data_files(env, docname):
+    """Returns the files named in the page's code, relative to the source directory."""
+    source_path = pathlib.Path(env.doc2path(docname))
+    files = set()
+    for match in DATA_FILE.finditer(read_code(source_path)):
+        # code runs with the page's directory as its working directory
+        path = source_path.parent / match.group(2)
+        if path.is_file():
+            files.add(os.path.relpath(path.resolve(), env.srcdir))
+    return sorted(files)
+
+
+def record_dependencies(app, doctree):
+    """Records the dependencies of the page just read."""
+    import admonitionlists
+
+    env = app.env
+    docname = env.docname
+
+    files = find_data_files(env, docname)
+    for path in files:
+        env.note_dependency(path)
+
+    terms = {node['dterm'] for node in doctree.traverse(nodes.strong) if 'dterm' in node}
+
+    lists = [
+        name for name, list_node in sorted(admonitionlists.LIST_NODES.items())
+        if doctree.traverse(list_node)
+    ]
+
+    get_graph(env)[docname] = {
+        'files': files,
+        'glossary_terms': sorted(terms),
+        'admonition_lists': lists,
+    }
+
+
+def purge_dependencies(app, env, docname):
+    get_graph(env).pop(docname, None)
+
+
+def merge_dependencies(app, env, docnames, other):
+    """
+    Merges the dependencies recorded by a parallel reader process while reading
+    the documents in `docnames` into the main environment.
+    """
+    graph = get_graph(env)
+    other_graph = get_graph(other)
+    for docname in docnames:
+        if docname in other_graph:
+            graph[docname] = other_graph[docname]
+
+
+# invalidation
+# ------------
+
+def explain_change(env, docname):
+    """Returns the reasons Sphinx found the page changed."""
+    if docname in env.reread_always:
+        return ['it is always read again']
+
+    mtime = env.all_docs[docname]
+    if os.path.getmtime(env.doc2path(docname)) > mtime:
+        return ['its source changed']
+
+    reasons = []
+    for dependency in sorted(env.dependencies[docname]):
+        path = os.path.join(env.srcdir, dependency)
+        if not os.path.isfile(path) or os.path.getmtime(path) > mtime:
+            reasons.append(f'{dependency} changed')
+    return reasons or ['its doctree is missing']
+
+
+def get_admonition_docnames(env):
+    """Maps each kind of admonition list to the pages with entries in it."""
+    import admonitionlists
+
+    return {
+        name: set(admonitionlists.get_admonition_registry(env, name).docnames())
+        for name in admonitionlists.LIST_NODES
+    }
+
+
+def find_outdated(app, env, added, changed, removed):
+    """Returns the pages to read again because glossary entries they use changed."""
+    import dterms
+
+    rebuilt = env.dependencygraph_rebuilt = {}
+    for docname in added:
+        rebuilt[docname] = ['it is new']
+    for docname in changed:
+        rebuilt[docname] = explain_change(env, docname)
+
+    index = dterms.get_glossary_index(env) or {}
+    previous_index = getattr(env, 'dependencygraph_glossary_index', None)
+    env.dependencygraph_glossary_index = index
+
+    outdated = []
+    if previous_index is not None:
+        for docname, dependencies in sorted(get_graph(env).items()):
+            if docname in added or docname in changed or docname in removed:
+                continue
+            terms = [
+                term for term in dependencies['glossary_terms']
+                if index.get(term) != previous_index.get(term)
+            ]
+            if terms:
+                rebuilt[docname] = [f'the glossary entry for {term!r} changed' for term in terms]
+                outdated.append(docname)
+
+    # kept until env-get-updated, once the pages have been read
+    env.dependencygraph_pending = {
+        'removed': set(removed),
+        'admonitions': get_admonition_docnames(env),
+    }
+
+    return outdated
+
+
+def note_read(app, env, docnames):
+    """Notes the pages about to be read, including those other extensions added."""
+    env.dependencygraph_pending['read'] = set(docnames)
+
+
+def find_updated(app, env):
+    """Returns the pages to write again because the entries of their lists changed."""
+    pending = env.dependencygraph_pending
+    del env.dependencygraph_pending
+
+    changed_docnames = pending['read'] | pending['removed']
+    current_admonitions = get_admonition_docnames(env)
+
+    updated = []
+    for name, docnames in current_admonitions.items():
+        contributors = sorted((docnames | pending['admonitions'][name]) & changed_docnames)
+        if not contributors:
+            continue
+
+        for docname, dependencies in sorted(get_graph(env).items()):
+            if name in dependencies['admonition_lists'] and docname not in pending['read']:
+                env.dependencygraph_rebuilt.setdefault(docname, []).append(
+                    f'the entries of its {name} changed in {", ".join(contributors)}')
+                updated.append(docname)
+
+    return updated
+
+
+# reporting
+# ---------
+
+def make_report(app):
+    env = app.env
+    admonitions = get_admonition_docnames(env)
+
+    documents = {}
+    for docname, dependencies in sorted(get_graph(env).items()):
+        documents[docname] = {
+            'source': env.doc2path(docname, base=None),
+            **dependencies,
+            'admonitions': [name for name, docnames in sorted(admonitions.items())
+                            if docname in docnames],
+        }
+
+    return {
+        'builder': app.builder.name,
+        'glossary': app.config.dterm_glossary,
+        'documents': documents,
+        'rebuilt': dict(sorted(getattr(env, 'dependencygraph_rebuilt', {}).items())),
+    }
+
+
+def make_dot(report):
+    """Returns the graph in Graphviz's DOT language, with rebuilt pages in bold."""
+    lines = ['digraph dependencies {', '    rankdir=LR;']
+
+    for docname in report['rebuilt']:
+        lines.append(f'    {json.dumps(docname)} [style=bold];')
+
+    for docname, document in report['documents'].items():
+        for path in document['files']:
+            lines.append(f'    {json.dumps(docname)} -> {json.dumps(path)} [label="reads"];')
+
+        if document['glossary_terms']:
+            lines.append(f'    {json.dumps(docname)} -> {json.dumps(report["glossary"])} '
+                         f'[label="dterm"];')
+
+        for name in document['admonition_lists']:
+            for other, other_document in report['documents'].items():
+                if name in other_document['admonitions']:
+                    lines.append(f'    {json.dumps(docname)} -> {json.dumps(other)} '
+                                 f'[label={json.dumps(name)}];')
+
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_report(app, exception):
+    if exception is not None:
+        return
+
+    report = make_report(app)
+    directory = pathlib.Path(app.outdir).parent
+
+    with (directory / 'dependencies.json').open('w') as fileobj:
+        json.dump(report, fileobj, indent=2)
+    (directory / 'dependencies.dot').write_text(make_dot(report))
+
+    logger.info(f'dependency graph written to {directory / "dependencies.json"}')
+
+
+def setup(app):
+    app.setup_extension('dterms')
+    app.setup_extension('admonitionlists')
+
+    app.connect('doctree-read', record_dependencies)
+    app.connect('env-purge-doc', purge_dependencies)
+    app.connect('env-merge-info', merge_dependencies)
+    app.connect('env-get-outdated', find_outdated)
+    app.connect('env-before-read-docs', note_read)
+    app.connect('env-get-updated', find_updated)
+    app.connect('build-finished', write_report)
+
+    return {
+        'version': '0.1',
+        'env_version': 1,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -3,14 +3,111 @@ from docutils.parsers.rst import roles
 
 from sphinx import addnodes
 # from sphinx.domains.std import Glossary, make_glossary_term
+from sphinx.util import logging
 from sphinx.util.docutils import ReferenceRole
 from sphinx.util.nodes import process_index_entry
 
+import os
 import re
 
+logger = logging.getLogger(__name__)
+
+
+# Glossary Index
+# --------------
+#
+# Every use of the role is checked against the terms defined in the glossary
+# document. The glossary is parsed into an index once, and parsed again only if
+# the glossary file changes. The index maps the canonical id of each term, and
+# of its plural forms, to the id of the term itself; the term's anchor in the
+# glossary is "term-<id>".
+
+# a {glossary} directive opened by a code fence or colon fence at column zero
+GLOSSARY_FENCE = re.compile(r'(`{3,}|:{3,})\{glossary\}')
+
+
+def parse_glossary_terms(source):
+    """Yields the terms defined by the {glossary} directives in MyST source."""
+    fence = None
+
+    for line in source.splitlines():
+        if fence is None:
+            match = GLOSSARY_FENCE.match(line)
+            if match is not None:
+                fence = match.group(1)
+            continue
+
+        stripped = line.rstrip()
+        if stripped.startswith(fence) and stripped == fence[0] * len(stripped):
+            # the closing fence
+            fence = None
+        elif stripped and not line[0].isspace() and not line.startswith(':'):
+            # not blank, part of a definition, or an option: this is a term,
+            # possibly followed by a classifier
+            yield stripped.split(' : ')[0]
+
+
+def make_glossary_index(terms):
+    """Maps the ids of the terms and their plural forms to the ids of the terms."""
+    index = {}
+
+    for term in terms:
+        for form in (term + 's', term + 'es'):
+            index.setdefault(nodes.make_id(form), nodes.make_id(term))
+
+    # a term defined in the glossary always refers to itself, even if it happens
+    # to look like the plural of another term
+    for term in terms:
+        index[nodes.make_id(term)] = nodes.make_id(term)
+
+    return index
+
+
+_glossary_indices = {}
+
+
+def get_glossary_index(env):
+    """Returns the index of the glossary, or None if there is no glossary."""
+    path = env.doc2path(env.config.dterm_glossary)
+
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+    if key not in _glossary_indices:
+        with open(path, encoding='utf-8') as fileobj:
+            terms = list(parse_glossary_terms(fileobj.read()))
+        _glossary_indices.clear()
+        _glossary_indices[key] = make_glossary_index(terms)
+
+    return _glossary_indices[key]
+
 
 class DtermRole(ReferenceRole):
 
+    def get_document_info(self):
+        """
+        Returns information shared by every use of the role in the document
+        being read, computing it on first use. It is kept in the environment's
+        temp_data, which Sphinx clears after each document is read.
+        """
+        info = self.env.temp_data.get('dterm_document_info')
+
+        if info is None:
+            info = self.env.temp_data['dterm_document_info'] = {
+                'glossary_index': get_glossary_index(self.env),
+                'glossary_uri': self.env.app.builder.get_relative_uri(
+                    self.env.docname, self.config.dterm_glossary),
+            }
+
+        if 'page_title' not in info:
+            title = self.inliner.document.next_node(nodes.title)
+            if title is not None:
+                info['page_title'] = title[0].astext()
+
+        return info
+
     def run(self):
 
 #         print(f"""
@@ -22,14 +119,26 @@ class DtermRole(ReferenceRole):
 #         """)
 #         1/0
 
+        info = self.get_document_info()
+        glossary_index = info['glossary_index']
+
         term = self.target # This way we can still specify {dterm}`word <target>`
-        #! We can add extra canonicalization steps here
-        #
-        # This is just a rudimentary "remove the s" thing
-        term = re.sub('s$', '', term)
-        canon_term = nodes.make_id(term)
-        
-        page_title = self.inliner.document.next_node(nodes.title)[0].astext()
+        if glossary_index is None:
+            # without a glossary to check against, fall back to a rudimentary
+            # "remove the s" canonicalization
+            canon_term = nodes.make_id(re.sub('s$', '', term))
+            is_known = True
+        else:
+            canon_term = glossary_index.get(nodes.make_id(term))
+            is_known = canon_term is not None
+            if not is_known:
+                logger.warning(
+                    f'dterm: {term!r} is not a term in the glossary',
+                    location=(self.env.docname, self.lineno)
+                )
+                canon_term = nodes.make_id(term)
+
+        page_title = info.get('page_title', self.env.docname)
 
         target_id = 'index-%s' % self.env.new_serialno('index')
         indexnode = addnodes.index(entries=process_index_entry(
@@ -40,16 +149,25 @@ class DtermRole(ReferenceRole):
 
         rendered = nodes.Text(self.title)
 
-        base_uri = self.env.app.builder.get_relative_uri(self.env.docname, 'glossary')
-        reference_uri = f"{base_uri}#term-{canon_term}"
-        reference = nodes.reference('', rendered, refuri=reference_uri)
-        text_node = nodes.strong('', '', reference)
+        if is_known:
+            reference_uri = f"{info['glossary_uri']}#term-{canon_term}"
+            reference = nodes.reference('', rendered, refuri=reference_uri)
+            text_node = nodes.strong('', '', reference)
+        else:
+            # rather than a broken link, just the emphasized text
+            text_node = nodes.strong('', '', rendered)
+
+        # the term as written, so that dependencygraph can tell which pages
+        # must be read again when the glossary changes
+        text_node['dterm'] = nodes.make_id(term)
 
         return [indexnode, target, text_node], []
         
 
 def setup(app):
 
+    app.add_config_value('dterm_glossary', 'glossary', 'env')
+
     roles.register_local_role("dterm", DtermRole())
 
     return {
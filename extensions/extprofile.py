@@ -0,0 +1,254 @@
+"""Measures how much of the build each of our extensions is responsible for.
+
+Use
+---
+
+Set `extprofile: true` under `sphinx: config:` in `_config.yml`, or set the
+environment variable `EXTPROFILE=1`, and build as usual. A JSON report is then
+written to `extprofile.json` next to the builder's output directory, i.e.
+`src/_build/extprofile.json`.
+
+"""
+
+# General Logic
+# -------------
+#
+# Once every extension has been set up, at `config-inited`, the directives,
+# roles, and event handlers defined in the profiled modules are replaced by
+# wrappers which time each call, and count the nodes returned by directives and
+# roles. Nothing is wrapped unless profiling is enabled.
+#
+# The measurements are kept in the environment, indexed by docname, for the same
+# reason the admonitionlists registries are: with `sphinx -j N`, directives and
+# roles run in reader processes, and their measurements must be merged back into
+# the main environment at `env-merge-info`. Event handlers run in the main
+# process, and their measurements are not tied to a document.
+#
+# The measurements are cleared when each build starts, so the report only covers
+# the documents read and written by that build.
+
+from sphinx.util import logging
+
+import json
+import math
+import os
+import pathlib
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILED_MODULES = [
+    'admonitionlists',
+    'dterms',
+    'hiddenanswer',
+    'jupyterhublink',
+    'jupytertips',
+]
+
+
+def is_enabled(config):
+    return config.extprofile or os.environ.get('EXTPROFILE', '') not in ('', '0')
+
+
+# recording
+# ---------
+
+def get_measurements(env):
+    if not hasattr(env, 'extprofile_measurements'):
+        env.extprofile_measurements = {'times': {}, 'nodes': {}}
+    return env.extprofile_measurements
+
+
+def record(env, key, elapsed, docname=None, result=None):
+    """
+    Records one call of the thing identified by `key`, a (module, kind, name)
+    tuple. `result` is the list of nodes it returned, if any.
+    """
+    measurements = get_measurements(env)
+
+    times = measurements['times'].setdefault(key, {})
+    times.setdefault(docname, []).append(elapsed)
+
+    if result is not None:
+        count = sum(1 for node in result for _ in node.traverse())
+        counts = measurements['nodes'].setdefault(key, {})
+        counts[docname] = counts.get(docname, 0) + count
+
+
+def reset_measurements(app):
+    app.env.extprofile_measurements = {'times': {}, 'nodes': {}}
+
+
+def merge_measurements(app, env, docnames, other):
+    """
+    Merges the measurements made by a parallel reader process while reading the
+    documents in `docnames` into the main environment.
+    """
+    measurements = get_measurements(env)
+    other_measurements = get_measurements(other)
+
+    # the reader process started from a copy of the main environment, so only
+    # take what it measured for the documents it read
+    for kind in ('times', 'nodes'):
+        for key, by_docname in other_measurements[kind].items():
+            merged = measurements[kind].setdefault(key, {})
+            for docname in docnames:
+                if docname in by_docname:
+                    merged[docname] = by_docname[docname]
+
+
+# wrapping
+# --------
+
+def wrap_directive(directive, key):
+    """Returns a subclass of the directive whose run method is timed."""
+    run = directive.run
+
+    def timed_run(self):
+        start = time.perf_counter()
+        result = run(self)
+        # not every directive is a SphinxDirective with an env attribute
+        env = self.state.document.settings.env
+        record(env, key, time.perf_counter() - start, env.docname, result)
+        return result
+
+    return type(directive.__name__, (directive,), {'run': timed_run})
+
+
+def wrap_role(role, key):
+    """Returns a role function which calls and times the role."""
+
+    def timed_role(name, rawtext, text, lineno, inliner, options={}, content=[]):
+        start = time.perf_counter()
+        result = role(name, rawtext, text, lineno, inliner, options, content)
+        env = inliner.document.settings.env
+        record(env, key, time.perf_counter() - start, env.docname, result[0])
+        return result
+
+    return timed_role
+
+
+def wrap_handler(handler, key):
+    """Returns an event handler which calls and times the handler."""
+
+    def timed_handler(app, *args):
+        start = time.perf_counter()
+        result = handler(app, *args)
+        record(app.env, key, time.perf_counter() - start)
+        return result
+
+    return timed_handler
+
+
+def defining_module(obj):
+    return getattr(obj, '__module__', None) or type(obj).__module__
+
+
+def wrap_extensions(app, config):
+    """Wraps the directives, roles, and event handlers of the profiled modules."""
+    if not is_enabled(config):
+        return
+
+    # imported here, as these are only populated once the extensions are set up
+    from docutils.parsers.rst import directives, roles
+
+    for name, directive in list(directives._directives.items()):
+        module = defining_module(directive)
+        if isinstance(directive, type) and module in config.extprofile_modules:
+            wrapped = wrap_directive(directive, (module, 'directive', name))
+            app.add_directive(name, wrapped, override=True)
+
+    for name, role in list(roles._roles.items()):
+        module = defining_module(role)
+        if callable(role) and module in config.extprofile_modules:
+            app.add_role(name, wrap_role(role, (module, 'role', name)), override=True)
+
+    for event, listeners in app.events.listeners.items():
+        for i, listener in enumerate(listeners):
+            module = defining_module(listener.handler)
+            if module in config.extprofile_modules:
+                key = (module, 'event', f'{event}:{listener.handler.__name__}')
+                listeners[i] = listener._replace(handler=wrap_handler(listener.handler, key))
+
+    app.connect('builder-inited', reset_measurements)
+    app.connect('env-merge-info', merge_measurements)
+    app.connect('build-finished', write_report)
+
+
+# reporting
+# ---------
+
+def percentile(sorted_values, p):
+    """The nearest-rank percentile of a non-empty, sorted list."""
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(times, node_counts):
+    """Summarizes the measurements of one directive, role, or event handler."""
+    all_times = sorted(t for by_docname in times.values() for t in by_docname)
+    summary = {
+        'calls': len(all_times),
+        'total_ms': sum(all_times) * 1000,
+        'mean_ms': sum(all_times) / len(all_times) * 1000,
+        'p95_ms': percentile(all_times, 95) * 1000,
+        'max_ms': all_times[-1] * 1000,
+    }
+
+    if node_counts is not None:
+        summary['nodes'] = sum(node_counts.values())
+        summary['nodes_per_document'] = dict(sorted(node_counts.items()))
+
+    return summary
+
+
+def make_report(app, exception):
+    measurements = get_measurements(app.env)
+
+    extensions = {}
+    for key in sorted(measurements['times']):
+        module, kind, name = key
+        summary = summarize(measurements['times'][key], measurements['nodes'].get(key))
+        extensions.setdefault(module, {})[f'{kind} {name}'] = summary
+
+    totals = {
+        module: sum(summary['total_ms'] for summary in summaries.values())
+        for module, summaries in extensions.items()
+    }
+
+    return {
+        'builder': app.builder.name,
+        'succeeded': exception is None,
+        'total_ms': totals,
+        'extensions': extensions,
+    }
+
+
+def write_report(app, exception):
+    path = app.config.extprofile_report
+    if path is None:
+        path = pathlib.Path(app.outdir).parent / 'extprofile.json'
+    else:
+        path = pathlib.Path(app.confdir) / path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w') as fileobj:
+        json.dump(make_report(app, exception), fileobj, indent=2)
+
+    logger.info(f'extension profile written to {path}')
+
+
+def setup(app):
+
+    app.add_config_value('extprofile', False, '')
+    app.add_config_value('extprofile_modules', PROFILED_MODULES, '')
+    app.add_config_value('extprofile_report', None, '')
+
+    # after any other handlers, so that every extension has been set up
+    app.connect('config-inited', wrap_extensions, priority=900)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
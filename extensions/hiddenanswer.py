@@ -12,23 +12,80 @@ answer: This is the answer.
 """
 from docutils import nodes
 from docutils.parsers.rst import Directive
+from docutils.statemachine import StringList
 
 from sphinx.locale import _
+from sphinx.transforms.post_transforms import SphinxPostTransform
 from sphinx.util.docutils import SphinxDirective
 
+import parsecache
+
 
 class hiddenanswer(nodes.General, nodes.Element):
     pass
 
 
-def visit_hiddenanswer_node(self, node):
+class hiddenanswer_question(nodes.General, nodes.Element):
     pass
 
 
-def depart_hiddenanswer_node(self, node):
+class hiddenanswer_answer(nodes.General, nodes.Element):
     pass
 
 
+# HTML: the question is always shown, the answer is revealed on click
+
+def visit_hiddenanswer_html(self, node):
+    self.body.append(self.starttag(node, 'div', CLASS='hiddenanswer'))
+
+
+def depart_hiddenanswer_html(self, node):
+    self.body.append('</div>\n')
+
+
+def visit_hiddenanswer_question_html(self, node):
+    self.body.append(self.starttag(node, 'div', CLASS='hiddenanswer-question'))
+
+
+def depart_hiddenanswer_question_html(self, node):
+    self.body.append('</div>\n')
+
+
+def visit_hiddenanswer_answer_html(self, node):
+    self.body.append(self.starttag(node, 'details', CLASS='hiddenanswer-answer'))
+    self.body.append(f"<summary>{self.encode(_('Answer'))}</summary>\n")
+
+
+def depart_hiddenanswer_answer_html(self, node):
+    self.body.append('</details>\n')
+
+
+# elsewhere: there is nothing to click in print or plain text, so the question is
+# kept as it was parsed, and the answer follows it as a quote under a label
+
+class HiddenAnswerTransform(SphinxPostTransform):
+    """Replaces each hidden answer with standard nodes, for builders other than HTML."""
+
+    default_priority = 400
+
+    def run(self):
+        if self.app.builder.format == 'html':
+            return
+
+        for answer in list(self.document.traverse(hiddenanswer_answer)):
+            label = nodes.strong('', _('Answer') + ':')
+            body = answer.children
+            if body and isinstance(body[0], nodes.paragraph):
+                body[0].insert(0, [label, nodes.Text(' ')])
+            else:
+                body.insert(0, nodes.paragraph('', '', label))
+            answer.replace_self(nodes.block_quote('', *body))
+
+        containers = lambda node: isinstance(node, (hiddenanswer, hiddenanswer_question))
+        for node in list(self.document.traverse(containers)):
+            node.replace_self(node.children)
+
+
 class HiddenAnswerDirective(SphinxDirective):
 
     has_content = True
@@ -39,35 +96,36 @@ class HiddenAnswerDirective(SphinxDirective):
         'answer': str
     }
 
+    def parse_option(self, name, node):
+        """Parses the markup in an option's text into the node."""
+        source, line = self.get_source_info()
+        text = StringList(self.options[name].splitlines(), source=source)
+        parsecache.nested_parse(self, text, self.content_offset, node)
+        return node
+
     def run(self):
         node = hiddenanswer()
+        self.set_source_info(node)
 
-        s = f"""
-```````{{tabs}}
-``````{{tab}} Question
-
-{self.options['question']}
-``````
-``````{{tab}} Answer
-
-{self.options['answer']}
-``````
-
-```````
-        """
-
-        self.content = [s]
-        self.state.nested_parse(self.content, 0, node)
+        node += self.parse_option('question', hiddenanswer_question())
+        node += self.parse_option('answer', hiddenanswer_answer())
 
         return [node]
 
 
 def setup(app):
+    app.setup_extension('parsecache')
+
     app.add_node(hiddenanswer,
-                 html=(visit_hiddenanswer_node, depart_hiddenanswer_node),
-                 latex=(visit_hiddenanswer_node, depart_hiddenanswer_node),
-                 text=(visit_hiddenanswer_node, depart_hiddenanswer_node))
+                 html=(visit_hiddenanswer_html, depart_hiddenanswer_html))
 
+    app.add_node(hiddenanswer_question,
+                 html=(visit_hiddenanswer_question_html, depart_hiddenanswer_question_html))
+
+    app.add_node(hiddenanswer_answer,
+                 html=(visit_hiddenanswer_answer_html, depart_hiddenanswer_answer_html))
+
+    app.add_post_transform(HiddenAnswerTransform)
     app.add_directive('hiddenanswer', HiddenAnswerDirective)
 
     return {
@@ -75,4 +133,3 @@ def setup(app):
         'parallel_read_safe': True,
         'parallel_write_safe': True,
     }
-
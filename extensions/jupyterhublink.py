@@ -1,7 +1,7 @@
 """Provides a directive which creates a link to open a notebook in JupyterHub
 ."""
 
-import yaml
+import functools
 import pathlib
 
 from docutils import nodes
@@ -10,10 +10,44 @@ from docutils.parsers.rst import Directive
 from sphinx.locale import _
 from sphinx.util.docutils import SphinxDirective
 
-config_path = pathlib.Path(__file__).parent / '../src/_config.yml'
+import parsecache
 
-with config_path.open() as fileobj:
-    config = yaml.load(fileobj, Loader=yaml.Loader)
+# the jupyter-book config, relative to the directory of the book
+BOOK_CONFIG = '_config.yml'
+
+
+@functools.lru_cache(maxsize=None)
+def load_book_config(path):
+    """Reads the jupyter-book config. Only used when building outside of
+    jupyter-book, which would otherwise have passed the settings to Sphinx."""
+    import yaml
+
+    # the C loader is much faster, but is not available in every build of pyyaml
+    Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    with pathlib.Path(path).open() as fileobj:
+        return yaml.load(fileobj, Loader=Loader)
+
+
+def resolve_launch_settings(app, config):
+    """Fills in the JupyterHub URL and repository URL, if they are not set
+    explicitly, from the theme options that jupyter-book derives from the book
+    config, or failing that from the book config itself, which is looked for in
+    the directory of the book being built."""
+    theme_options = config.html_theme_options or {}
+    config_path = pathlib.Path(app.confdir or app.srcdir) / BOOK_CONFIG
+
+    if config.jupyterhub_url is None:
+        jupyterhub_url = theme_options.get('launch_buttons', {}).get('jupyterhub_url')
+        if jupyterhub_url is None:
+            jupyterhub_url = load_book_config(config_path)['launch_buttons']['jupyterhub_url']
+        config.jupyterhub_url = jupyterhub_url
+
+    if config.jupyterhub_repository_url is None:
+        repository_url = theme_options.get('repository_url')
+        if repository_url is None:
+            repository_url = load_book_config(config_path)['repository']['url']
+        config.jupyterhub_repository_url = repository_url
 
 
 class jupyterhublink(nodes.General, nodes.Element):
@@ -28,6 +62,7 @@ def depart_jupyterhublink_node(self, node):
     pass
 
 
+@functools.lru_cache(maxsize=None)
 def make_jupyterhub_launch_url(jupyterhub_url, repo_url, path_to_notebook):
     tree = repo_url.split('/')[-1]
     return f"{jupyterhub_url}/hub/user-redirect/git-pull?repo={repo_url}&urlpath=tree/{tree}/{path_to_notebook}"
@@ -42,20 +77,22 @@ class JupyterHubLinkDirective(SphinxDirective):
         node = jupyterhublink()
 
         url = make_jupyterhub_launch_url(
-                config['launch_buttons']['jupyterhub_url'],
-                config['repository']['url'],
+                self.config.jupyterhub_url,
+                self.config.jupyterhub_repository_url,
                 self.arguments[0]
                 )
 
         link = f"<a href=\"{url}\" target=\"_blank\">Launch in JupyterHub</a>"
 
         self.content = [link]
-        self.state.nested_parse(self.content, 0, node)
+        parsecache.nested_parse(self, self.content, 0, node)
 
         return [node]
 
 
 def setup(app):
+    app.setup_extension('parsecache')
+
     app.add_node(jupyterhublink,
                  html=(visit_jupyterhublink_node, depart_jupyterhublink_node),
                  latex=(visit_jupyterhublink_node, depart_jupyterhublink_node),
@@ -63,9 +100,12 @@ def setup(app):
 
     app.add_directive('jupyterhublink', JupyterHubLinkDirective)
 
+    app.add_config_value('jupyterhub_url', None, 'env')
+    app.add_config_value('jupyterhub_repository_url', None, 'env')
+    app.connect('config-inited', resolve_launch_settings)
+
     return {
         'version': '0.1',
         'parallel_read_safe': True,
         'parallel_write_safe': True,
     }
-
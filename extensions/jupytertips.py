@@ -3,6 +3,8 @@ from docutils import nodes
 from sphinx.locale import _
 from sphinx.util.docutils import SphinxDirective
 
+import parsecache
+
 def generic_visit_admonition(self, node):
     self.visit_admonition(node)
 def generic_depart_admonition(self, node):
@@ -19,11 +21,12 @@ class JupyterTip(SphinxDirective):
         jupytertip_node = jupytertip('\n'.join(self.content))
         jupytertip_node += nodes.title(_('Jupyter Tip'), _('Jupyter Tip'))
         jupytertip_node.set_class('jupytertip')
-        self.state.nested_parse(self.content, self.content_offset, jupytertip_node)
+        parsecache.nested_parse(self, self.content, self.content_offset, jupytertip_node)
 
         return [jupytertip_node]
 
 def setup(app):
+    app.setup_extension('parsecache')
 
     app.add_node(
         jupytertip,
@@ -0,0 +1,42 @@
+"""Sets up every extension used by the notes, in the order they depend on.
+
+Use
+---
+
+List `notesextensions` alone, in place of the individual extensions, under
+`sphinx: extra_extensions:` in `_config.yml`. The extensions are installed along
+with the rest of the environment by `poetry install`, so no `PYTHONPATH` is
+needed.
+
+"""
+
+# General Logic
+# -------------
+#
+# Nothing is imported until Sphinx calls `setup`, and then each extension is
+# imported by `app.setup_extension`, which does nothing for an extension that is
+# already set up. Extensions which depend on another (such as admonitionlists,
+# which extends the jupytertip directive) set that one up themselves, too, so the
+# order below only matters for readability.
+
+EXTENSIONS = [
+    'parsecache',
+    'jupyterhublink',
+    'hiddenanswer',
+    'dterms',
+    'jupytertips',
+    'admonitionlists',
+    'dependencygraph',
+    'extprofile',
+]
+
+
+def setup(app):
+    for extension in EXTENSIONS:
+        app.setup_extension(extension)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,246 @@
+"""Parses identical directive content once per build, rather than once per use.
+
+Use
+---
+
+Directives which parse their content call `parsecache.nested_parse` in place of
+`self.state.nested_parse`, and call `app.setup_extension('parsecache')` in their
+`setup`. Set `parsecache = False` in the Sphinx config to parse everything every
+time. The number of cache hits and misses is logged at the end of each build.
+
+"""
+
+# General Logic
+# -------------
+#
+# Many pages contain identical tips and questions. Each time a directive parses
+# some content, a hash of the directive's name, options, and content is noted.
+# The second time the same content is parsed, deep copies of the nodes produced
+# are kept in a cache under that hash; from then on, whenever identical content is
+# parsed, by any directive on any page, a deep copy of the cached nodes is used
+# instead. Content which is only parsed once, as most is, is never copied.
+#
+# The key also includes the directory of the document, since roles such as
+# `dterm` produce URIs relative to it. The copies are then fixed up to look as if
+# they had been parsed in place: their source and line numbers are moved to the
+# new location, and cross-references are attributed to the new document.
+#
+# Not everything can be reused this way. Content which declares targets (anything
+# with ids or names), which leaves work for transforms (`pending` nodes), or which
+# produced system messages or logged warnings, is parsed every time, so that it
+# registers and reports itself in each document as usual. Its key is remembered,
+# so that later uses of it are parsed directly, without being checked again.
+#
+# The cache is kept in memory, per process, and cleared before each build reads
+# any pages, so that an application kept between builds (see `scripts/watch.py`)
+# never reuses content parsed against an older glossary or configuration.
+# The counts are kept in the environment, indexed by docname, and merged at
+# `env-merge-info`, for the same reason as the extprofile measurements: with
+# `sphinx -j N`, directives run in reader processes.
+
+from docutils import nodes
+
+from sphinx import addnodes
+from sphinx.util import logging
+
+import hashlib
+import json
+import logging as python_logging
+import posixpath
+
+logger = logging.getLogger(__name__)
+
+# nodes whose meaning depends on where they are in the document
+UNCACHEABLE_NODES = (
+    nodes.system_message,
+    nodes.pending,
+    nodes.target,
+    nodes.footnote_reference,
+    nodes.citation_reference,
+    nodes.substitution_reference,
+)
+
+# maps a key to the cached nodes, and the content offset they were parsed at
+_cache = {}
+
+# the keys of content parsed once, and not yet cached
+_seen = set()
+
+# the keys of content found to be uncacheable, which is parsed directly from then on
+_uncacheable = set()
+
+
+# counting
+# --------
+
+def get_stats(env):
+    if not hasattr(env, 'parsecache_stats'):
+        env.parsecache_stats = {}
+    return env.parsecache_stats
+
+
+def count(env, outcome):
+    stats = get_stats(env).setdefault(env.docname, {})
+    stats[outcome] = stats.get(outcome, 0) + 1
+
+
+def reset(app, env, docnames):
+    _cache.clear()
+    _seen.clear()
+    _uncacheable.clear()
+    env.parsecache_stats = {}
+
+
+def merge_stats(app, env, docnames, other):
+    """
+    Merges the counts made by a parallel reader process while reading the
+    documents in `docnames` into the main environment.
+    """
+    stats = get_stats(env)
+    other_stats = get_stats(other)
+    for docname in docnames:
+        if docname in other_stats:
+            stats[docname] = other_stats[docname]
+
+
+def report(app, exception):
+    totals = {'hit': 0, 'miss': 0, 'uncacheable': 0}
+    for by_outcome in get_stats(app.env).values():
+        for outcome, n in by_outcome.items():
+            totals[outcome] += n
+
+    if any(totals.values()):
+        logger.info(f"parse cache: {totals['hit']} hits, {totals['miss']} misses, "
+                    f"{totals['uncacheable']} uncacheable")
+
+
+# parsing
+# -------
+
+class _WarningDetector(python_logging.Handler):
+    """Notices whether anything logs a warning while it is attached."""
+
+    def __init__(self):
+        super().__init__(python_logging.WARNING)
+        self.warned = False
+
+    def emit(self, record):
+        self.warned = True
+
+    def __enter__(self):
+        python_logging.getLogger('sphinx').addHandler(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        python_logging.getLogger('sphinx').removeHandler(self)
+
+
+def make_key(directive, content, env):
+    parts = [
+        directive.name,
+        sorted(directive.options.items()),
+        list(content),
+        posixpath.dirname(env.docname),
+    ]
+    encoded = json.dumps(parts, default=repr).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def is_cacheable(parsed):
+    for node in parsed:
+        for descendant in node.traverse():
+            if isinstance(descendant, UNCACHEABLE_NODES):
+                return False
+            if isinstance(descendant, nodes.Element) and (
+                    descendant['ids'] or descendant['names']):
+                return False
+    return True
+
+
+def detach(parsed):
+    """Copies parsed nodes for the cache, without the document they belong to.
+
+    A copied node keeps a reference to the original's document, which would
+    otherwise keep that whole document alive, and be pickled with every document
+    the node is copied into.
+    """
+    copies = [node.deepcopy() for node in parsed]
+    for node in copies:
+        for descendant in node.traverse():
+            descendant.document = None
+    return copies
+
+
+def relocate(parsed, document, source, line_delta, docname):
+    """Makes copies of cached nodes look as if they were parsed in place."""
+    for node in parsed:
+        for descendant in node.traverse():
+            descendant.document = document
+            if descendant.source is not None:
+                descendant.source = source
+            if descendant.line is not None:
+                descendant.line += line_delta
+            if isinstance(descendant, addnodes.pending_xref):
+                descendant['refdoc'] = docname
+
+
+def nested_parse(directive, content, content_offset, node):
+    """Like `directive.state.nested_parse(content, content_offset, node)`, but
+    reuses the nodes from an earlier parse of identical content, if any."""
+    env = directive.state.document.settings.env
+
+    if not env.config.parsecache:
+        directive.state.nested_parse(content, content_offset, node)
+        return
+
+    key = make_key(directive, content, env)
+
+    if key in _cache:
+        cached, cached_offset = _cache[key]
+        parsed = [child.deepcopy() for child in cached]
+        source, _ = directive.state_machine.get_source_and_line(directive.lineno)
+        relocate(parsed, directive.state.document, source,
+                 content_offset - cached_offset, env.docname)
+        node.extend(parsed)
+        count(env, 'hit')
+        return
+
+    if key in _uncacheable:
+        directive.state.nested_parse(content, content_offset, node)
+        count(env, 'uncacheable')
+        return
+
+    if key not in _seen:
+        # most content is never repeated, so nothing is copied until it is
+        _seen.add(key)
+        directive.state.nested_parse(content, content_offset, node)
+        count(env, 'miss')
+        return
+
+    start = len(node.children)
+    with _WarningDetector() as detector:
+        directive.state.nested_parse(content, content_offset, node)
+    parsed = node.children[start:]
+
+    if detector.warned or not is_cacheable(parsed):
+        _uncacheable.add(key)
+        count(env, 'uncacheable')
+        return
+
+    _cache[key] = (detach(parsed), content_offset)
+    count(env, 'miss')
+
+
+def setup(app):
+
+    app.add_config_value('parsecache', True, 'env')
+
+    app.connect('env-before-read-docs', reset)
+    app.connect('env-merge-info', merge_stats)
+    app.connect('build-finished', report)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,295 @@
+"""
+Keep the state of the HTML build between builds on fresh checkouts.
+
+Sphinx only re-reads the pages which have changed since the last build, and, with
+`execute_notebooks: cache` in `_config.yml`, jupyter-book only re-executes the
+notebooks whose code has changed. Both rely on the build directory being kept:
+Sphinx on the doctrees and environment in `src/_build/.doctrees`, jupyter-book on
+the execution cache in `src/_build/.jupyter_cache`. Those can be restored on a fresh
+checkout (by CI, for instance), but a fresh checkout also gives every source file
+a new modification time, and Sphinx would then consider every page changed.
+
+Usage
+-----
+    python cached_build.py save
+    python cached_build.py restore
+
+`save` is run after a build. It records the content hash and modification time of
+every source file and data set, along with a hash of everything else the build
+depends on: the locked dependencies and the extensions.
+
+`restore` is run before a build. If that hash has changed, the cached build state
+may no longer be valid, and it is deleted. Otherwise, every source file and data
+set whose contents are unchanged is given back its recorded modification time, so
+that only the pages which really changed are re-read and re-executed. The pages
+which read a changed data set are found in the dependency graph written by the
+last build (see `extensions/dependencygraph.py`); Sphinx reads them again, and
+their notebooks' outputs are removed from the execution cache so that they are
+executed again.
+
+This script is invoked by the `html-cached` target in the Makefile at the root of
+the directory. It does not need to be invoked manually.
+"""
+
+# configuration
+# ======================================================================================
+
+# all paths are relative to the root of the repository
+
+# the directories holding the sources of the book, and the data sets they read
+SOURCE_DIRECTORIES = ['src', 'data']
+
+# where the book is built from, and the data sets are kept
+BOOK_DIRECTORY = 'src'
+DATA_DIRECTORY = 'data'
+
+# the build directory, and the build state kept in it
+BUILD_DIRECTORY = 'src/_build'
+CACHED_PATHS = ['.doctrees', '.jupyter_cache', 'dependencies.json']
+EXECUTION_CACHE = '.jupyter_cache'
+DEPENDENCY_GRAPH = 'dependencies.json'
+STATE_FILE = '.cached-build.json'
+
+# a change to any of these files invalidates the cached build state
+ENVIRONMENT_FILES = ['pyproject.toml', 'poetry.lock', 'flake.nix', 'flake.lock']
+ENVIRONMENT_DIRECTORIES = ['extensions']
+
+# directories that should not be searched for files
+EXCLUDED_FROM_SEARCH = {'_build', '.ipynb_checkpoints', '__pycache__', '.cache'}
+
+
+# ======================================================================================
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+# hashing
+# ======================================================================================
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of the file's contents."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def find_files(directory):
+    """Recursively yields the files in the directory, skipping excluded directories.
+
+    Symbolic links to directories are not followed, so that data linked into the
+    sources is not hashed twice.
+    """
+    for root, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_FROM_SEARCH)
+        for filename in sorted(filenames):
+            path = pathlib.Path(root) / filename
+            if path.is_file():
+                yield path
+
+
+def hash_environment(root=ROOT):
+    """Returns a hash of everything besides the sources that the build depends on."""
+    digest = hashlib.sha256()
+
+    paths = [root / name for name in ENVIRONMENT_FILES if (root / name).is_file()]
+    for name in ENVIRONMENT_DIRECTORIES:
+        paths.extend(find_files(root / name))
+
+    for path in paths:
+        digest.update(path.relative_to(root).as_posix().encode())
+        digest.update(hash_file(path).encode())
+
+    return digest.hexdigest()
+
+
+def record_sources(source_directories, root=ROOT):
+    """Returns the content hash and modification time of every source file.
+
+    Returns
+    -------
+    Dict[str, Dict]
+        Maps each file's path, relative to root, to its 'sha256' and 'mtime_ns'.
+
+    """
+    sources = {}
+    for directory in source_directories:
+        for path in find_files(directory):
+            sources[path.relative_to(root).as_posix()] = {
+                'sha256': hash_file(path),
+                'mtime_ns': path.stat().st_mtime_ns,
+            }
+    return sources
+
+
+# main
+# ======================================================================================
+
+def save(root=ROOT):
+    """Records the state of the sources and environment after a build."""
+    build_directory = root / BUILD_DIRECTORY
+    source_directories = [root / name for name in SOURCE_DIRECTORIES]
+
+    state = {
+        'environment': hash_environment(root),
+        'sources': record_sources(source_directories, root),
+    }
+
+    build_directory.mkdir(parents=True, exist_ok=True)
+    with (build_directory / STATE_FILE).open('w') as fileobj:
+        json.dump(state, fileobj, indent=1, sort_keys=True)
+
+    print(f'cached_build: recorded {len(state["sources"])} source files')
+
+
+def restore(root=ROOT):
+    """Prepares the cached build state, if any, for the next build.
+
+    Returns
+    -------
+    List[str]
+        The paths, relative to root, of the source files which have changed or are
+        new since the state was saved. Empty if the cached state was discarded.
+
+    """
+    build_directory = root / BUILD_DIRECTORY
+    source_directories = [root / name for name in SOURCE_DIRECTORIES]
+
+    try:
+        with (build_directory / STATE_FILE).open() as fileobj:
+            state = json.load(fileobj)
+    except FileNotFoundError:
+        print('cached_build: no cached build state; building from scratch')
+        return []
+
+    if state['environment'] != hash_environment(root):
+        print('cached_build: dependencies or extensions have changed; '
+              'discarding the cached build state')
+        for name in CACHED_PATHS + [STATE_FILE]:
+            path = build_directory / name
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        return []
+
+    changed = []
+    recorded = state['sources']
+    sources = record_sources(source_directories, root)
+    for relative_path, current in sources.items():
+        previous = recorded.get(relative_path)
+        if previous is not None and previous['sha256'] == current['sha256']:
+            os.utime(root / relative_path, ns=(previous['mtime_ns'], previous['mtime_ns']))
+        else:
+            changed.append(relative_path)
+
+    print(f'cached_build: {len(changed)} of {len(sources)} source files changed')
+    for relative_path in changed:
+        print(f'    {relative_path}')
+
+    changed_data = {
+        (root / relative_path).resolve() for relative_path in changed
+        if pathlib.PurePosixPath(relative_path).parts[0] == DATA_DIRECTORY
+    }
+    if changed_data:
+        notebooks = find_dependent_notebooks(changed_data, root)
+        discard_executions(notebooks, build_directory / EXECUTION_CACHE)
+        for path in notebooks:
+            print(f'    {path.relative_to(root)} reads a changed data set; executing it again')
+
+    return changed
+
+
+# data dependencies
+# ======================================================================================
+
+def read_notebook_dependencies(root=ROOT):
+    """Maps each notebook to the data sets it reads, per the last build's graph."""
+    try:
+        with (root / BUILD_DIRECTORY / DEPENDENCY_GRAPH).open() as fileobj:
+            documents = json.load(fileobj)['documents']
+    except FileNotFoundError:
+        return {}
+
+    book_directory = root / BOOK_DIRECTORY
+    dependencies = {}
+    for document in documents.values():
+        path = book_directory / document['source']
+        if path.suffix == '.ipynb' and path.is_file():
+            dependencies[path] = {(book_directory / name).resolve() for name in document['files']}
+    return dependencies
+
+
+def find_dependent_notebooks(data_paths, root=ROOT):
+    """Returns the notebooks which read any of the data sets, per the last build."""
+    return sorted(
+        path for path, files in read_notebook_dependencies(root).items() if files & data_paths
+    )
+
+
+def find_stale_notebooks(cache_path, root=ROOT):
+    """Returns the notebooks which read a data set changed since they were executed.
+
+    Unlike `restore`, this needs no saved state: the modification time of each data
+    set a notebook reads is compared with the time its outputs were cached.
+    """
+    dependencies = read_notebook_dependencies(root)
+    if not any(dependencies.values()) or not cache_path.is_dir():
+        return []
+
+    # imported here, as they are only needed when a notebook reads a data set
+    import nbformat
+    from jupyter_cache import get_cache
+
+    cache = get_cache(str(cache_path))
+    stale = []
+    for path, files in sorted(dependencies.items()):
+        if not files:
+            continue
+
+        try:
+            record = cache.match_cache_notebook(nbformat.read(str(path), as_version=4))
+        except KeyError:
+            continue
+
+        # jupyter-cache records times in UTC, without a time zone
+        executed = record.created.replace(tzinfo=datetime.timezone.utc).timestamp()
+        if any(file.is_file() and file.stat().st_mtime > executed for file in files):
+            stale.append(path)
+
+    return stale
+
+
+def discard_executions(notebook_paths, cache_path):
+    """Removes the notebooks' outputs from the execution cache."""
+    if not notebook_paths or not cache_path.is_dir():
+        return
+
+    # imported here, as they are only needed when a data set has changed
+    import nbformat
+    from jupyter_cache import get_cache
+
+    cache = get_cache(str(cache_path))
+    for path in notebook_paths:
+        notebook = nbformat.read(str(path), as_version=4)
+        try:
+            record = cache.match_cache_notebook(notebook)
+        except KeyError:
+            continue
+        cache.remove_cache(record.pk)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['save', 'restore'])
+    args = parser.parse_args()
+
+    if args.command == 'save':
+        save()
+    else:
+        restore()
@@ -1,24 +1,224 @@
 """Recursively searches for notebooks and clears the output of every cell.
 
 This script is used as a Git pre-commit hook.
+
+Usage
+-----
+    python clear_notebook_outputs.py [--staged] [--jobs N]
+
+By default, every notebook under the current directory is cleared. With
+`--staged`, only the notebooks staged in Git are cleared, and it is their staged
+versions, in the index, which are cleared: this is what is about to be committed,
+and may differ from the working copy. A working copy is cleared as well if it has
+no unstaged changes; otherwise it is left alone, so that unstaged work is neither
+lost nor committed. This is what the pre-commit hook uses. Notebooks which
+already have no outputs are left untouched. With `--jobs N`, notebooks are
+cleared in N worker processes (`--jobs 0` uses one process per CPU).
 """
 
+import argparse
+import concurrent.futures
 import pathlib
+import subprocess
 
-from traitlets.config import Config
-from nbconvert.exporters import NotebookExporter
 import nbformat
 
+from make_reader_friendly_notebooks import job_count, write_atomically, writes_notebook
+
+
+# directories that should not be searched for notebooks
+EXCLUDED_FROM_SEARCH = {'_build', '.ipynb_checkpoints'}
+
+
+# the cell metadata fields which only make sense when the cell has outputs. these are
+# the same fields that nbconvert's ClearOutputPreprocessor removes
+OUTPUT_METADATA_FIELDS = {'collapsed', 'scrolled'}
+
+
+def has_outputs(notebook):
+    """Determines if any code cell has something that clear_cell_outputs removes."""
+    for cell in notebook['cells']:
+        if cell['cell_type'] != 'code':
+            continue
+        if cell['outputs'] or cell['execution_count'] is not None:
+            return True
+        if OUTPUT_METADATA_FIELDS.intersection(cell.get('metadata', {})):
+            return True
+    return False
+
+
+def clear_cell_outputs(notebook):
+    """Clears the outputs and execution counts of all code cells. Modifies in-place."""
+    for cell in notebook['cells']:
+        if cell['cell_type'] == 'code':
+            cell['outputs'] = []
+            cell['execution_count'] = None
+            if 'metadata' in cell:
+                for field in OUTPUT_METADATA_FIELDS:
+                    cell['metadata'].pop(field, None)
+
 
 def clear_outputs(notebook_path):
-    c = Config()
-    c.NotebookExporter.preprocessors = ['nbconvert.preprocessors.ClearOutputPreprocessor']
-    notebook, resources = NotebookExporter(config=c).from_filename(notebook_path)
+    """Clears the outputs of the notebook at the path.
+
+    The notebook is only rewritten if it has outputs to clear. Returns True if the
+    notebook was rewritten and False otherwise.
+    """
+    with notebook_path.open() as fileobj:
+        notebook = nbformat.read(fileobj, as_version=4)
+
+    if not has_outputs(notebook):
+        return False
+
+    clear_cell_outputs(notebook)
+    write_atomically(notebook_path, writes_notebook(notebook))
+
+    return True
+
+
+def clear_staged_outputs(notebook_path):
+    """Clears the outputs of the staged version of the notebook at the path.
+
+    The staged version is read from the index, not from the working tree. Returns
+    the text of the cleared notebook, or None if it has no outputs to clear.
+    """
+    staged = git('show', f':./{notebook_path.as_posix()}')
+    notebook = nbformat.reads(staged, as_version=4)
+
+    if not has_outputs(notebook):
+        return None
+
+    clear_cell_outputs(notebook)
+    return writes_notebook(notebook)
+
+
+# git
+# ======================================================================================
+
+def git(*args, input=None):
+    """Runs a git command, returning its output."""
+    return subprocess.run(
+        ['git', *args], input=input, check=True, stdout=subprocess.PIPE,
+        encoding='utf-8'
+    ).stdout
+
+
+def find_unstaged_changes(notebook_paths):
+    """Returns the paths of the notebooks whose working copies differ from the index."""
+    if not notebook_paths:
+        return set()
+    output = git('diff', '--name-only', '--relative', '-z', '--',
+                 *(str(path) for path in notebook_paths))
+    return {pathlib.Path(name) for name in output.split('\0') if name}
+
 
-    with notebook_path.open('w') as fileobj:
-        fileobj.write(notebook)
+def restage(notebook_path, text):
+    """Replaces the staged version of the notebook with the text, keeping its mode."""
+    mode = git('ls-files', '--stage', '--', str(notebook_path)).split()[0]
+    blob = git('hash-object', '-w', '--stdin', input=text).strip()
+    git('update-index', '--cacheinfo', f'{mode},{blob},{notebook_path.as_posix()}')
+
+
+# finding notebooks
+# ======================================================================================
+
+def is_excluded(path):
+    return any(d in path.parts for d in EXCLUDED_FROM_SEARCH)
+
+
+def find_notebooks(directory):
+    """Yield paths of all the notebooks not in a EXCLUDED_FROM_SEARCH directory."""
+    for path in directory.glob('**/*.ipynb'):
+        if not is_excluded(path):
+            yield path
+
+
+def find_staged_notebooks():
+    """Yield paths, relative to the current directory, of the staged notebooks."""
+    output = git('diff', '--cached', '--name-only', '--relative', '-z',
+                 '--diff-filter=ACMR', '--', '*.ipynb')
+
+    for name in output.split('\0'):
+        if name and not is_excluded(pathlib.Path(name)):
+            yield pathlib.Path(name)
+
+
+# main
+# ======================================================================================
+
+def clear_all_outputs(notebook_paths, jobs=1):
+    """Clears the outputs of every notebook.
+
+    Arguments
+    ---------
+    notebook_paths : List[pathlib.Path]
+        The notebooks to clear.
+    jobs : int
+        The number of worker processes to use. If 1, the notebooks are cleared
+        serially in the current process. If 0, one worker per CPU is used.
+
+    Returns
+    -------
+    List[pathlib.Path]
+        The paths of the notebooks which were rewritten, in sorted order.
+
+    """
+    notebook_paths = sorted(notebook_paths)
+    was_rewritten = map_notebooks(clear_outputs, notebook_paths, jobs)
+    return [path for path, rewritten in zip(notebook_paths, was_rewritten) if rewritten]
+
+
+def clear_staged_notebooks(notebook_paths, jobs=1):
+    """Clears the outputs of the staged versions of the notebooks, in the index.
+
+    The working copies of the notebooks which have no unstaged changes are
+    cleared too. Those with unstaged changes are left as they are.
+
+    Returns
+    -------
+    List[pathlib.Path]
+        The paths of the notebooks which were restaged, in sorted order.
+
+    """
+    notebook_paths = sorted(notebook_paths)
+    unstaged = find_unstaged_changes(notebook_paths)
+
+    # the index is only updated from this process, as git locks it while writing
+    texts = map_notebooks(clear_staged_outputs, notebook_paths, jobs)
+    rewritten = []
+    for path, text in zip(notebook_paths, texts):
+        if text is None:
+            continue
+        restage(path, text)
+        if path not in unstaged:
+            # the user's notebook, so never left half-written if the hook is stopped
+            write_atomically(path, text)
+        rewritten.append(path)
+
+    return rewritten
+
+
+def map_notebooks(function, notebook_paths, jobs):
+    """Calls the function on each of the paths, returning a list of the results."""
+    # starting a pool of workers isn't worth it for a single notebook
+    if jobs == 1 or len(notebook_paths) <= 1:
+        return [function(path) for path in notebook_paths]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        return list(executor.map(function, notebook_paths))
 
 
 if __name__ == '__main__':
-    for notebook_path in pathlib.Path.cwd().glob('**/*.ipynb'):
-        clear_outputs(notebook_path)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--staged', action='store_true',
+        help='only clear the staged versions of the notebooks staged in git')
+    parser.add_argument(
+        '--jobs', type=job_count, default=1,
+        help='number of worker processes; 0 means one per CPU (default: 1)')
+    args = parser.parse_args()
+
+    if args.staged:
+        clear_staged_notebooks(list(find_staged_notebooks()), jobs=args.jobs)
+    else:
+        clear_all_outputs(list(find_notebooks(pathlib.Path.cwd())), jobs=args.jobs)
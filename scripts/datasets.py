@@ -0,0 +1,152 @@
+"""
+Manage the data sets used in the notes.
+
+`data/` is the single canonical store of the data sets. Pages which read data sets
+do so through links to it, such as `src/02-data_sets/data`, rather than through
+copies. `data/manifest.json` records the size and SHA-256 hash of each data set.
+
+Usage
+-----
+    python datasets.py verify
+    python datasets.py update
+
+`verify` checks that every data set in the store matches the manifest, that the
+manifest lists every data set in the store, and that every `data` directory under
+`src/` is a link to the store rather than a copy of it. It exits with a nonzero
+status, listing the problems, if not. The hashes are computed in place, so nothing
+is copied.
+
+`update` rewrites the manifest from the data sets in the store. It should be run,
+and the manifest committed, whenever a data set is added, changed, or removed.
+
+CI runs `verify` before building. The builds themselves read the store through
+the links, so nothing is ever copied out of it.
+"""
+
+# configuration
+# ======================================================================================
+
+# the canonical store, relative to the root of the repository
+STORE_DIRECTORY = 'data'
+MANIFEST_FILE = 'manifest.json'
+
+# the files in the store which are data sets
+DATASET_SUFFIXES = {'.csv'}
+
+# the sources, which may contain links to the store named after it
+SOURCE_DIRECTORY = 'src'
+
+
+# ======================================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of the file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with path.open('rb') as fileobj:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_datasets(store):
+    """Returns the paths of the data sets in the store, in sorted order."""
+    return sorted(
+        path for path in store.iterdir()
+        if path.is_file() and path.suffix in DATASET_SUFFIXES
+    )
+
+
+def make_manifest(store):
+    return {
+        'datasets': {
+            path.name: {'sha256': hash_file(path), 'size': path.stat().st_size}
+            for path in find_datasets(store)
+        }
+    }
+
+
+def read_manifest(store):
+    with (store / MANIFEST_FILE).open() as fileobj:
+        return json.load(fileobj)
+
+
+def write_manifest(store, manifest):
+    with (store / MANIFEST_FILE).open('w') as fileobj:
+        json.dump(manifest, fileobj, indent=1, sort_keys=True)
+        fileobj.write('\n')
+
+
+# verification
+# ======================================================================================
+
+def find_store_copies(source_directory, store):
+    """Yields directories in the sources named like the store but not linking to it."""
+    for root, dirnames, _ in os.walk(source_directory):
+        dirnames[:] = [d for d in dirnames if d != '_build']
+        for dirname in dirnames:
+            path = pathlib.Path(root) / dirname
+            if dirname == store.name and not (path.is_symlink() and path.resolve() == store):
+                yield path
+
+
+def verify(root=ROOT):
+    """Checks the store against the manifest, and the sources for copies of the store.
+
+    Returns
+    -------
+    List[str]
+        A description of each problem found. Empty if there are none.
+
+    """
+    store = (root / STORE_DIRECTORY).resolve()
+    problems = []
+
+    try:
+        expected = read_manifest(store)['datasets']
+    except FileNotFoundError:
+        return [f'{store / MANIFEST_FILE} does not exist; run `datasets.py update`']
+
+    present = {path.name: path for path in find_datasets(store)}
+
+    for name, entry in sorted(expected.items()):
+        path = present.get(name)
+        if path is None:
+            problems.append(f'{name}: in the manifest, but missing from the store')
+        elif path.stat().st_size != entry['size'] or hash_file(path) != entry['sha256']:
+            problems.append(f'{name}: does not match its hash in the manifest')
+
+    for name in sorted(present.keys() - expected.keys()):
+        problems.append(f'{name}: in the store, but missing from the manifest')
+
+    for path in find_store_copies(root / SOURCE_DIRECTORY, store):
+        problems.append(f'{path.relative_to(root)}: should be a link to {STORE_DIRECTORY}/')
+
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('verify')
+    subparsers.add_parser('update')
+    args = parser.parse_args()
+
+    if args.command == 'update':
+        write_manifest(ROOT / STORE_DIRECTORY, make_manifest(ROOT / STORE_DIRECTORY))
+        sys.exit(0)
+
+    problems = verify()
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(1)
@@ -0,0 +1,282 @@
+"""
+Execute the notebooks used as pages in the notes, ahead of the HTML build.
+
+With `execute_notebooks: cache` in `_config.yml`, jupyter-book takes the outputs of
+each notebook from a jupyter-cache, and executes the notebooks which are missing
+from it one at a time. The notebooks are independent of one another, so this script
+executes the missing ones in a pool of kernels instead, and stores their outputs in
+the same cache; the build then finds every notebook already executed.
+
+Usage
+-----
+    python execute_notebooks.py [--jobs N] [--timeout S] [--cache PATH] src_directory
+
+This recursively finds all of the notebooks under src_directory, and executes each
+one which is not already in the cache (by default, `src_directory/_build/.jupyter_cache`,
+where jupyter-book looks for it). A notebook which reads a data set, according to
+the dependency graph of the last build (see `extensions/dependencygraph.py`), is
+also executed again if the data set has changed since its outputs were cached, as
+the cache only notices changes to the code. Each notebook runs in its own kernel,
+with its own directory as the working directory, just as jupyter-book would run
+it. With `--jobs N`, up to N notebooks are executed at once (`--jobs 0` uses one
+process per CPU).
+
+The time allowed for each cell, and whether errors are allowed, are read from the
+`execute` section of `_config.yml`. In addition, a notebook is stopped if it runs for
+longer than `--timeout` seconds in total. Notebooks which fail or time out are not
+cached, so that the build runs them again and reports the error in context; they
+are listed at the end, and the script exits with a nonzero status.
+
+Outputs are added to the cache in sorted order, once every notebook has finished,
+so the cache does not depend on the order in which the notebooks complete.
+
+This script is invoked by the `html` targets in the Makefile at the root of the
+directory. It does not need to be invoked manually.
+"""
+
+# configuration
+# ======================================================================================
+
+# directories that should not be searched for notebooks
+EXCLUDED_FROM_SEARCH = {'_build', '.ipynb_checkpoints'}
+
+# the defaults used by jupyter-book, if _config.yml does not say otherwise
+DEFAULT_CELL_TIMEOUT = 30
+DEFAULT_ALLOW_ERRORS = False
+
+
+# ======================================================================================
+
+import argparse
+import concurrent.futures
+import os
+import pathlib
+import signal
+import sys
+import time
+
+import nbformat
+import yaml
+
+import cached_build
+
+
+def find_notebooks(path):
+    """Recursively yield paths to notebooks, skipping excluded directories."""
+    for root, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_FROM_SEARCH]
+        for filename in filenames:
+            if filename.endswith('.ipynb'):
+                yield pathlib.Path(root) / filename
+
+
+def read_execution_config(src_directory):
+    """Returns the cell timeout and whether errors are allowed, from _config.yml."""
+    try:
+        with (src_directory / '_config.yml').open() as fileobj:
+            config = yaml.safe_load(fileobj) or {}
+    except FileNotFoundError:
+        config = {}
+
+    execute = config.get('execute') or {}
+    return (
+        execute.get('timeout', DEFAULT_CELL_TIMEOUT),
+        execute.get('allow_errors', DEFAULT_ALLOW_ERRORS),
+    )
+
+
+# execution
+# ======================================================================================
+
+class NotebookTimeout(Exception):
+    pass
+
+
+def _raise_notebook_timeout(signum, frame):
+    raise NotebookTimeout()
+
+
+def execute_notebook(notebook_path, cell_timeout, notebook_timeout, allow_errors):
+    """Executes a single notebook in a new kernel.
+
+    Arguments
+    ---------
+    notebook_path : pathlib.Path
+        The notebook to execute. Its directory is used as the working directory.
+    cell_timeout : int
+        The time, in seconds, that a cell may run for.
+    notebook_timeout : int
+        The time, in seconds, that the whole notebook may run for. If 0, there is
+        no limit.
+    allow_errors : bool
+        Whether to keep going when a cell raises an exception.
+
+    Returns
+    -------
+    Tuple[str, float, Optional[str]]
+        The executed notebook, serialized; the time it took in seconds; and a
+        description of the error if the notebook could not be executed, else None.
+
+    """
+    # imported here, so that the parent process does not need to import them
+    import nbclient
+    from nbclient.exceptions import CellExecutionError, CellTimeoutError
+    from nbclient.util import run_sync
+
+    notebook = nbformat.read(str(notebook_path), as_version=4)
+
+    # like jupyter-book, a notebook's metadata may override the configuration
+    execution = notebook.metadata.get('execution', {})
+    client = nbclient.NotebookClient(
+        notebook,
+        timeout=execution.get('timeout', cell_timeout),
+        allow_errors=execution.get('allow_errors', allow_errors),
+        record_timing=False,
+        resources={'metadata': {'path': str(notebook_path.parent)}},
+    )
+
+    error = None
+    start = time.perf_counter()
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_notebook_timeout)
+    signal.alarm(notebook_timeout)
+    try:
+        client.execute()
+    except NotebookTimeout:
+        error = f'timed out after {notebook_timeout} seconds'
+        # the client was interrupted before it could shut the kernel down
+        if client.km is not None and client.km.has_kernel:
+            run_sync(client.km.shutdown_kernel)(now=True)
+    except CellTimeoutError as exc:
+        error = f'a cell timed out: {exc}'
+    except CellExecutionError as exc:
+        error = str(exc)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+    return nbformat.writes(notebook), time.perf_counter() - start, error
+
+
+def _try_execute_notebook(notebook_path, cell_timeout, notebook_timeout, allow_errors):
+    """Like execute_notebook, but any unexpected exception is reported as the error."""
+    try:
+        return execute_notebook(notebook_path, cell_timeout, notebook_timeout, allow_errors)
+    except Exception as exc:
+        return None, 0.0, f'{type(exc).__name__}: {exc}'
+
+
+# main
+# ======================================================================================
+
+def find_unexecuted_notebooks(notebook_paths, cache):
+    """Returns the notebooks whose code has no executed counterpart in the cache."""
+    unexecuted = []
+    for path in notebook_paths:
+        notebook = nbformat.read(str(path), as_version=4)
+        try:
+            cache.match_cache_notebook(notebook)
+        except KeyError:
+            unexecuted.append(path)
+    return unexecuted
+
+
+def execute_notebooks(src_directory, cache_path, jobs=1, notebook_timeout=0):
+    """Executes every notebook missing from the cache, and caches the results.
+
+    Arguments
+    ---------
+    src_directory : pathlib.Path
+        The directory containing the notebooks, and _config.yml.
+    cache_path : pathlib.Path
+        The jupyter-cache to check and fill.
+    jobs : int
+        The number of notebooks to execute at once. If 0, one per CPU.
+    notebook_timeout : int
+        The time, in seconds, that each notebook may run for. If 0, no limit.
+
+    Returns
+    -------
+    Dict[pathlib.Path, str]
+        The notebooks which could not be executed, mapped to a description of the
+        error, in sorted order. Empty if every notebook was executed.
+
+    """
+    from jupyter_cache import get_cache
+    from jupyter_cache.base import NbBundleIn
+
+    cell_timeout, allow_errors = read_execution_config(src_directory)
+
+    # the cache is keyed by code alone, so outputs computed from a data set which has
+    # since changed would otherwise be kept
+    stale = cached_build.find_stale_notebooks(cache_path)
+    cached_build.discard_executions(stale, cache_path)
+    for path in stale:
+        print(f'{path.relative_to(src_directory.resolve())} reads a data set changed '
+              f'since it was executed; executing it again')
+
+    cache = get_cache(str(cache_path))
+    notebook_paths = sorted(path.resolve() for path in find_notebooks(src_directory))
+    unexecuted = find_unexecuted_notebooks(notebook_paths, cache)
+
+    print(f'{len(notebook_paths) - len(unexecuted)} of {len(notebook_paths)} '
+          f'notebooks already executed; executing {len(unexecuted)}')
+
+    arguments = (cell_timeout, notebook_timeout, allow_errors)
+    if jobs == 1 or len(unexecuted) <= 1:
+        results = [_try_execute_notebook(path, *arguments) for path in unexecuted]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            futures = [
+                executor.submit(_try_execute_notebook, path, *arguments)
+                for path in unexecuted
+            ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    # the worker itself died, e.g., it was killed by the OS
+                    results.append((None, 0.0, f'{type(exc).__name__}: {exc}'))
+
+    # results are in the (sorted) order of the notebooks, not of completion
+    failures = {}
+    for path, (source, seconds, error) in zip(unexecuted, results):
+        if error is not None:
+            failures[path] = error
+            continue
+
+        print(f'executed {path.relative_to(src_directory.resolve())} in {seconds:.1f}s')
+        cache.cache_notebook_bundle(
+            NbBundleIn(nbformat.reads(source, as_version=4), str(path),
+                       data={'execution_seconds': seconds}),
+            check_validity=False, overwrite=True
+        )
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src_directory', type=pathlib.Path)
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of notebooks to execute at once; 0 means one per CPU (default: 1)')
+    parser.add_argument(
+        '--timeout', type=int, default=0,
+        help='seconds each notebook may run for in total; 0 means no limit (default: 0)')
+    parser.add_argument(
+        '--cache', type=pathlib.Path,
+        help='the jupyter-cache to fill (default: src_directory/_build/.jupyter_cache)')
+    args = parser.parse_args()
+
+    cache_path = args.cache or args.src_directory / '_build' / '.jupyter_cache'
+
+    failures = execute_notebooks(
+        args.src_directory, cache_path, jobs=args.jobs, notebook_timeout=args.timeout)
+
+    for notebook_path, error in failures.items():
+        print(f'{notebook_path}: {error}', file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
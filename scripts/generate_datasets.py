@@ -0,0 +1,217 @@
+"""
+Generate the derived data sets in the store from their sources.
+
+Some of the data sets in `data/` are not collected, but computed from other data
+sets: `bootstrapped_median_salary_estimates.csv`, for instance, holds the medians
+of many bootstrap resamples of a sample of `salaries.csv`. The notes compute such
+data sets with a loop which draws one resample at a time, which is clear but slow
+at the number of resamples used. This script computes them in batches instead:
+the indices of many resamples are drawn at once, as a 2-D array with one row per
+resample, and the statistic is computed along its rows.
+
+Usage
+-----
+    python generate_datasets.py generate [--jobs N] destination
+    python generate_datasets.py verify [--jobs N]
+
+`generate` writes every derived data set to the destination directory. It does
+not overwrite the store; a generated data set is adopted by copying it into
+`data/` and running `datasets.py update`.
+
+`verify` generates every derived data set in memory, with the seed in the
+configuration below, and compares its CSV text byte for byte to the one in the
+store, exiting with a nonzero status, listing the problems, if they differ.
+
+Resamples are drawn in chunks of `chunk_size` rows, so at most `chunk_size` times
+`sample_size` indices are held in memory at once. Each chunk has its own random
+generator, spawned from the data set's seed, so the output depends only on the
+configuration below: with `--jobs N`, the chunks are shared among N processes
+(`--jobs 0` uses one process per CPU), and the output is the same.
+"""
+
+# configuration
+# ======================================================================================
+
+# the canonical store, relative to the root of the repository
+STORE_DIRECTORY = 'data'
+
+# the derived data sets, by file name
+DERIVED_DATASETS = {
+    'bootstrapped_median_salary_estimates.csv': {
+        # the population, one value per line
+        'source': 'salaries.csv',
+        # the size of the sample drawn, without replacement, from the population;
+        # the resamples are drawn from this sample
+        'sample_size': 100,
+        'resamples': 10_000,
+        'statistic': 'median',
+        'column': 'Estimate',
+        'seed': 42,
+        'chunk_size': 1_000,
+    },
+}
+
+
+# ======================================================================================
+
+import argparse
+import concurrent.futures
+import pathlib
+import sys
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+STATISTICS = {
+    'mean': np.mean,
+    'median': np.median,
+}
+
+
+# resampling
+# ======================================================================================
+
+def _bootstrap_chunk(sample, size, statistic, seed_sequence):
+    """Computes the statistic of `size` resamples of the sample, drawn at once."""
+    rng = np.random.default_rng(seed_sequence)
+    indices = rng.integers(0, len(sample), size=(size, len(sample)))
+    return STATISTICS[statistic](sample[indices], axis=1)
+
+
+def bootstrap(sample, resamples, statistic, seed, chunk_size, jobs=1):
+    """Computes the statistic of many resamples of the sample.
+
+    Arguments
+    ---------
+    sample : np.ndarray
+        The sample to resample, with replacement.
+    resamples : int
+        The number of resamples.
+    statistic : str
+        The name of the statistic; a key of STATISTICS.
+    seed : int or np.random.SeedSequence
+        The seed; each chunk's generator is spawned from it.
+    chunk_size : int
+        The number of resamples drawn at once.
+    jobs : int
+        The number of processes to share the chunks among. If 0, one per CPU.
+
+    Returns
+    -------
+    np.ndarray
+        The statistic of each resample, in order.
+
+    """
+    sizes = [chunk_size] * (resamples // chunk_size)
+    if resamples % chunk_size:
+        sizes.append(resamples % chunk_size)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seed_sequences = seed.spawn(len(sizes))
+
+    arguments = [(sample, size, statistic, s) for size, s in zip(sizes, seed_sequences)]
+    if jobs == 1 or len(sizes) <= 1:
+        chunks = [_bootstrap_chunk(*a) for a in arguments]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            chunks = list(executor.map(_bootstrap_chunk, *zip(*arguments)))
+
+    return np.concatenate(chunks)
+
+
+def generate_dataset(spec, jobs=1, root=ROOT):
+    """Generates a derived data set from its specification in DERIVED_DATASETS.
+
+    Returns
+    -------
+    np.ndarray
+        The values of the data set's one column.
+
+    """
+    population = np.loadtxt(root / STORE_DIRECTORY / spec['source'])
+
+    # one child of the seed draws the sample, the other the resamples
+    sample_seed, bootstrap_seed = np.random.SeedSequence(spec['seed']).spawn(2)
+    sample = np.random.default_rng(sample_seed).choice(
+        population, size=spec['sample_size'], replace=False)
+
+    return bootstrap(sample, spec['resamples'], spec['statistic'], bootstrap_seed,
+                     spec['chunk_size'], jobs=jobs)
+
+
+def format_dataset(spec, values):
+    """Returns the CSV text of a derived data set."""
+    lines = [spec['column']] + [repr(float(value)) for value in values]
+    return '\n'.join(lines) + '\n'
+
+
+# verification
+# ======================================================================================
+
+def compare(name, spec, generated, committed_text):
+    """Compares a generated data set to the committed one, byte for byte.
+
+    Returns
+    -------
+    List[str]
+        A description of each difference. Empty if there are none.
+
+    """
+    generated_text = format_dataset(spec, generated)
+    if committed_text == generated_text:
+        return []
+
+    # point at the first line which differs, to tell a changed seed or source
+    # from a truncated file
+    generated_lines = generated_text.splitlines()
+    committed_lines = committed_text.splitlines()
+    for i, (expected, actual) in enumerate(zip(generated_lines, committed_lines)):
+        if expected != actual:
+            return [f'{name}: line {i + 1} is {actual!r}; the generated data set has '
+                    f'{expected!r}']
+
+    return [f'{name}: has {len(committed_lines)} lines, ending with '
+            f'{committed_text[-1:]!r}; the generated data set has {len(generated_lines)}, '
+            f'ending with a newline']
+
+
+def verify(jobs=1, root=ROOT):
+    """Compares every derived data set in the store to a freshly generated one."""
+    problems = []
+    for name, spec in DERIVED_DATASETS.items():
+        committed_text = (root / STORE_DIRECTORY / name).read_text()
+        generated = generate_dataset(spec, jobs=jobs, root=root)
+        problems.extend(compare(name, spec, generated, committed_text))
+    return problems
+
+
+# main
+# ======================================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate')
+    generate_parser.add_argument('destination', type=pathlib.Path)
+    verify_parser = subparsers.add_parser('verify')
+    for subparser in (generate_parser, verify_parser):
+        subparser.add_argument(
+            '--jobs', type=int, default=1,
+            help='number of processes to draw resamples in; 0 means one per CPU (default: 1)')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        args.destination.mkdir(parents=True, exist_ok=True)
+        for name, spec in DERIVED_DATASETS.items():
+            values = generate_dataset(spec, jobs=args.jobs)
+            (args.destination / name).write_text(format_dataset(spec, values))
+            print(f'generated {args.destination / name}')
+        sys.exit(0)
+
+    problems = verify(jobs=args.jobs)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(1)
@@ -7,12 +7,26 @@ up and generates new notebooks that are "reader friendly".
 
 Usage
 -----
-    python make_reader_friendly_notebooks.py src_directory
+    python make_reader_friendly_notebooks.py [--jobs N] [--manifest PATH] [--stream] src_directory
 
 This recursively search and find all of the notebooks under src_directory,
 placing its output in the current directory in a way that mimics the directory
 structure of the source directory.
 
+Every notebook is processed independently of the others, so with `--jobs N` the
+notebooks are spread across N worker processes (`--jobs 0` uses one process per
+CPU). The output is identical to that of a serial run. Notebooks which cannot be
+processed are reported at the end, and the script exits with a nonzero status.
+
+With `--manifest PATH`, the script runs incrementally: only the notebooks whose
+contents have changed since the last run using the same manifest are regenerated,
+and outputs whose source notebooks no longer exist are deleted. If the
+configuration below (or this script itself) changes, everything is regenerated.
+
+With `--stream`, each notebook is read, transformed, and written one cell at a
+time, so that memory use is bounded by the largest cell rather than the whole
+notebook. This is useful for notebooks with very large embedded outputs.
+
 This script is invoked by the `notebooks` target in the Makefile at the root of
 the directory. It does not need to be invoked manually.
 """
@@ -30,35 +44,41 @@ HIDE_CELL_TAGS = {'hide-from-reader'}
 # ======================================================================================
 
 import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import inspect
+import json
+import os
 import pathlib
+import sys
 import yaml
 import re
 
-from traitlets.config import Config
-from nbconvert.exporters import NotebookExporter
 import nbformat
+from nbformat.v4 import nbjson, rwbase
 
 
 # hiding cells
 # ======================================================================================
 # code for hiding some of the notebook's cells from the reader
 
+def is_hidden(cell):
+    """Determines if the cell has a tag in HIDE_CELL_TAGS."""
+    try:
+        tags = set(cell['metadata']['tags'])
+    except KeyError:
+        tags = set()
+
+    return bool(tags.intersection(HIDE_CELL_TAGS))
+
+
 def hide_cells(notebook):
     """Removes all cells with tags in HIDE_CELL_TAGS. Modifies notebook in-place."""
     # we can't directly delete cells from the notebook node
     # instead, we'll build a new list of cells without the cells being filtered out
     # and replace the old cells with this new list in the node
-    new_cells = []
-    for cell in notebook['cells']:
-        try:
-            tags = set(cell['metadata']['tags'])
-        except KeyError:
-            tags = set()
-
-        if not tags.intersection(HIDE_CELL_TAGS):
-            new_cells.append(cell)
-
-    notebook['cells'] = new_cells
+    notebook['cells'] = [cell for cell in notebook['cells'] if not is_hidden(cell)]
 
 
 # cleaning toolbars
@@ -85,8 +105,8 @@ def clear_cell_toolbars(notebook):
 # transformation.
 
 # we'll do this by having a different transformation function for each directive. A transformation
-# function takes in a cell and modifies its source. We'll register these
-# transformers with a decorator:
+# function takes in a cell along with the body of its directive and modifies its source. We'll
+# register these transformers with a decorator:
 
 DIRECTIVE_TRANSFORMERS = dict()
 
@@ -100,33 +120,79 @@ def directive_transformer(directives):
     return decorator
 
 
-def remove_directive_markup(source):
-    """Removes the beginnning ```{} and ending ``` from the source."""
-    # remove the starting markup
-    source = re.sub('^`{3,}\{.+\}', '', source)
-    # remove the ending markup
-    source = re.sub('`{3,}$', '', source)
-    return source.strip()
+# a directive is opened by a fence of three or more backticks followed immediately by
+# the directive's name in braces, as in ```{warning}. the fence closing the directive
+# is a plain run of backticks at the very end of the cell
+DIRECTIVE_FENCE = re.compile(r'`{3,}\{(.+)\}')
 
 
-def find_directive_cells(notebook):
-    """Finds all cells starting with a directive."""
-    for cell in notebook['cells']:
-        all_directives = re.findall('`{3,}\{(.+)\}', cell['source'])
+def scan_directive(cell):
+    """Finds the cell's directive and the body of the directive in a single pass.
+
+    Only the places where a run of three or more backticks starts are examined, and
+    code cells are skipped altogether, since directives only appear in the fenced
+    blocks of markdown cells.
+
+    Returns
+    -------
+    Optional[Tuple[str, str]]
+        If the cell contains exactly one directive, its name along with its body: the
+        cell's source without the opening markup (if the source starts with it) and
+        the closing fence, stripped of surrounding whitespace. Otherwise, None.
 
-        if len(all_directives) == 1:
-            directive = all_directives[0]
-            yield directive, cell
+    """
+    if cell['cell_type'] == 'code':
+        return None
+
+    source = cell['source']
+    opening = None
+
+    position = source.find('```')
+    while position != -1:
+        fence = DIRECTIVE_FENCE.match(source, position)
+        if fence is not None:
+            if opening is not None:
+                # more than one directive
+                return None
+            opening = fence
+            position = source.find('```', fence.end())
         else:
-            continue
+            # if the fence can't match at the start of this run of backticks, it
+            # can't match anywhere later in the run either; skip to its end
+            end_of_run = position + 3
+            while source.startswith('`', end_of_run):
+                end_of_run += 1
+            position = source.find('```', end_of_run)
+
+    if opening is None:
+        return None
+
+    start = opening.end() if opening.start() == 0 else 0
+
+    # the closing fence may be followed by a single newline
+    end = len(source) - 1 if source.endswith('\n') else len(source)
+    without_closing = source[start:end].rstrip('`')
+    if end - start - len(without_closing) < 3:
+        # fewer than three backticks is not a closing fence
+        without_closing = source[start:end]
+
+    return opening.group(1), without_closing.strip()
+
+
+def transform_cell_by_directive(cell):
+    """Transforms the cell if its directive is recognized. Modifies cell in-place."""
+    scanned = scan_directive(cell)
+
+    if scanned is not None and scanned[0] in DIRECTIVE_TRANSFORMERS:
+        directive, body = scanned
+        transformer = DIRECTIVE_TRANSFORMERS[directive]
+        transformer(directive, cell, body)
 
 
 def transform_cells_by_directive(notebook):
     """Transforms cells whose first line is a recognized directive."""
-    for directive, cell in find_directive_cells(notebook):
-        if directive in DIRECTIVE_TRANSFORMERS:
-            transformer = DIRECTIVE_TRANSFORMERS[directive]
-            transformer(directive, cell)
+    for cell in notebook['cells']:
+        transform_cell_by_directive(cell)
 
 
 # admonition directives
@@ -149,7 +215,7 @@ HEADERS = {
 
 
 @directive_transformer(ADMONITION_DIRECTIVES)
-def transform_admonition_directive(directive, cell):
+def transform_admonition_directive(directive, cell, body):
     """Transform a cell containing an admonition.
 
     Transforms a cell containing something like:
@@ -166,22 +232,20 @@ def transform_admonition_directive(directive, cell):
         Oh no! Watch out!
 
     """
-    source = remove_directive_markup(cell['source'])
-
     if directive in HEADERS:
         header = HEADERS[directive]
     else:
         header = directive.title()
 
     # we'll transform this to some basic markdown
-    cell['source'] = f"**{header}**\n\n{source}"
+    cell['source'] = f"**{header}**\n\n{body}"
 
 
 # hiddenanswer directives
 # -----------------------
 
 @directive_transformer({'hiddenanswer'})
-def transform_hiddenanswer_directive(directive, cell):
+def transform_hiddenanswer_directive(directive, cell, body):
     """Transforms a cell containing a hiddenanswer directive.
 
     Takes this:
@@ -198,8 +262,7 @@ def transform_hiddenanswer_directive(directive, cell):
         **Answer**: This is the answer
 
     """
-    source = remove_directive_markup(cell['source'])
-    content = yaml.load(source, Loader=yaml.Loader)
+    content = yaml.load(body, Loader=yaml.Loader)
     cell['source'] = f"**Question**:\n {content['question']}\n\n<details><summary><b>Answer</b>:</summary>{content['answer']}</details>"
 
 
@@ -220,17 +283,371 @@ def read_notebook(path):
         return nbformat.read(fileobj, as_version=4)
 
 
+@contextlib.contextmanager
+def open_atomically(path):
+    """Opens a file for writing which replaces path only once it is complete.
+
+    The file object refers to a temporary file next to path, which is renamed over
+    path when the with-block exits normally. If the block raises, the temporary file
+    is deleted and path is left as it was. This way, a failed or interrupted write
+    never leaves a half-written file behind.
+    """
+    temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with temporary_path.open('w') as fileobj:
+            yield fileobj
+        os.replace(temporary_path, path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
+def write_atomically(path, text):
+    """Writes text to the path, never leaving a half-written file behind."""
+    with open_atomically(path) as fileobj:
+        fileobj.write(text)
+
+
+def writes_notebook(notebook):
+    """Serializes a notebook node to a string of nbformat v4 JSON.
+
+    The result is identical to what nbconvert's NotebookExporter produces, but
+    without the cost of setting up an exporter for every notebook.
+    """
+    notebook_code = nbformat.writes(notebook, version=4)
+    if not notebook_code.endswith('\n'):
+        notebook_code += '\n'
+    return notebook_code
+
+
 def write_notebook(path, notebook):
     """Writes a notebook node to the path."""
-    notebook_code, resources = NotebookExporter().from_notebook_node(notebook)
-    with path.open('w') as fileobj:
-        fileobj.write(notebook_code)
+    write_atomically(path, writes_notebook(notebook))
+
+
+# streaming
+# ======================================================================================
+# code for making a notebook reader friendly without loading all of it into memory.
+#
+# notebooks with large embedded outputs and images can be many megabytes, and reading
+# one into a notebook node (and then building a new list of its cells) takes several
+# times that. instead, the streaming engine decodes the notebook's JSON one cell at a
+# time, passes each cell through the same hide/transform steps as above, and writes it
+# out immediately. peak memory is therefore bounded by the largest cell.
+#
+# the output is identical to that of the in-memory path. to achieve this, each cell is
+# normalized as nbformat does when reading, and serialized as nbformat does when
+# writing, just one cell at a time. since the notebook is written as it is read, only
+# notebooks which are already nbformat 4 can be streamed; any others are handled by
+# the in-memory path.
+
+_NON_WHITESPACE = re.compile(r'\S')
+
+
+class JSONStream:
+    """Decodes JSON values one at a time from a text file object."""
+
+    def __init__(self, fileobj, chunk_size=1 << 16):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+
+    def _read_more(self, size):
+        """Appends up to size more characters to the buffer, discarding consumed ones.
+
+        Returns False if the end of the file has been reached.
+        """
+        chunk = '' if self.exhausted else self.fileobj.read(size)
+        if not chunk:
+            self.exhausted = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            match = _NON_WHITESPACE.search(self.buffer, self.position)
+            if match is not None:
+                self.position = match.start()
+                return self.buffer[self.position]
+
+            self.position = len(self.buffer)
+            if not self._read_more(self.chunk_size):
+                raise ValueError('Unexpected end of JSON.')
+
+    def expect(self, characters):
+        """Consumes the next non-whitespace character, which must be in characters."""
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(f'Expected one of {characters!r} in JSON, found {character!r}.')
+        self.position += 1
+        return character
+
+    def decode(self):
+        """Decodes and consumes the next JSON value."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # the value is incomplete. reading in ever larger pieces keeps the
+                # total work linear in the size of the value
+                if not self._read_more(size):
+                    raise
+                size *= 2
+                continue
+
+            # a value ending exactly at the end of the buffer may have been cut
+            # short, e.g., the number 45 when only the 4 has been read
+            if end == len(self.buffer) and self._read_more(size):
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_notebook_json(fileobj):
+    """Yields the top-level parts of a notebook's JSON one at a time.
+
+    Each item of the top-level "cells" array is yielded as ('cells', cell), in order.
+    Every other top-level key is yielded as (key, value).
+    """
+    stream = JSONStream(fileobj)
+
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+
+        if key == 'cells':
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    yield 'cells', stream.decode()
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            yield key, stream.decode()
+
+        if stream.expect(',}') == '}':
+            return
+
+
+def _as_notebook_fragment(cells, metadata):
+    """Wraps cells and metadata in a notebook node so nbformat's helpers accept them."""
+    return nbformat.from_dict({'cells': cells, 'metadata': metadata})
+
+
+def _dumps(value, depth):
+    """Serializes a value as nbformat does, as if it were nested depth levels deep."""
+    code = json.dumps(
+        value, cls=nbjson.BytesEncoder, indent=1, sort_keys=True,
+        separators=(',', ': '), ensure_ascii=False
+    )
+    # newlines never appear inside of JSON strings, so this only indents lines
+    return code.replace('\n', '\n' + ' ' * depth)
+
+
+class _CannotStream(Exception):
+    """Raised when a notebook turns out to be unsuitable for streaming."""
+
+
+def stream_reader_friendly_notebook(src_fileobj, dst_fileobj):
+    """Make a notebook reader friendly one cell at a time.
+
+    Arguments
+    ---------
+    src_fileobj : file object
+        The source notebook, opened for reading as text.
+    dst_fileobj : file object
+        Where the reader friendly notebook will be written as text.
+
+    Raises
+    ------
+    _CannotStream
+        If the notebook is not in nbformat 4. Some output may already have been
+        written to dst_fileobj in this case.
+
+    """
+    others = {}
+    cells_written = 0
+
+    dst_fileobj.write('{\n "cells": [')
+
+    for key, value in iter_notebook_json(src_fileobj):
+        if key != 'cells':
+            # these are small (metadata, nbformat, nbformat_minor); keep until the end
+            others[key] = value
+            continue
+
+        fragment = _as_notebook_fragment([value], {})
+        rwbase.strip_transient(rwbase.rejoin_lines(fragment))
+        cell = fragment['cells'][0]
+
+        if is_hidden(cell):
+            continue
+
+        transform_cell_by_directive(cell)
+
+        rwbase.strip_transient(rwbase.split_lines(fragment))
+        dst_fileobj.write((',' if cells_written else '') + '\n  ' + _dumps(cell, 2))
+        cells_written += 1
+
+    # the cells were written first as they would be by nbformat, since it sorts keys
+    if others.get('nbformat') != 4 or any(key < 'cells' for key in others):
+        raise _CannotStream()
+
+    dst_fileobj.write('\n ]' if cells_written else ']')
+
+    if 'metadata' in others:
+        fragment = _as_notebook_fragment([], others['metadata'])
+        rwbase.strip_transient(fragment)
+        clear_cell_toolbars(fragment)
+        others['metadata'] = fragment['metadata']
+
+    for key, value in sorted(others.items()):
+        dst_fileobj.write(f',\n {_dumps(key, 1)}: {_dumps(value, 1)}')
+
+    dst_fileobj.write('\n}\n')
+
+
+# incremental builds
+# ======================================================================================
+# code for regenerating only those notebooks whose inputs have changed.
+#
+# a manifest records the hash of every source notebook that was processed, along with
+# a hash of the configuration used to transform it. a notebook is regenerated only if
+# its hash differs from the one in the manifest. if the configuration hash differs,
+# every notebook is regenerated.
+
+def hash_file(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of the file's contents, read in chunks.
+
+    Reading in chunks keeps the notebook from being loaded whole, which `--stream`
+    exists to avoid.
+    """
+    digest = hashlib.sha256()
+    with path.open('rb') as fileobj:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_configuration():
+    """Returns a hash of everything that affects how each notebook is transformed.
+
+    This includes the transformer configuration as well as the source of this script,
+    so that changing how cells are found or transformed invalidates every output.
+    """
+    configuration = {
+        'hide_cell_tags': sorted(HIDE_CELL_TAGS),
+        'headers': HEADERS,
+        'directive_transformers': {
+            directive: inspect.getsource(transformer)
+            for directive, transformer in sorted(DIRECTIVE_TRANSFORMERS.items())
+        },
+        'script': hash_file(pathlib.Path(__file__)),
+    }
+    return hashlib.sha256(json.dumps(configuration, sort_keys=True).encode()).hexdigest()
+
+
+def read_manifest(path):
+    """Reads the manifest at path. Returns an empty manifest if it does not exist."""
+    try:
+        with path.open() as fileobj:
+            return json.load(fileobj)
+    except FileNotFoundError:
+        return {'configuration': None, 'notebooks': {}}
+
+
+def write_manifest(path, manifest):
+    """Writes the manifest to path."""
+    write_atomically(path, json.dumps(manifest, indent=1, sort_keys=True) + '\n')
+
+
+def remove_output(dst_directory, relative_path):
+    """Removes a generated notebook along with any directories this leaves empty."""
+    path = dst_directory / relative_path
+    if path.exists():
+        path.unlink()
+
+    for parent in path.parents:
+        if parent == dst_directory or dst_directory not in parent.parents:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            # the directory is not empty (or is already gone)
+            break
 
 
 # main
 # ======================================================================================
 
-def make_reader_friendly_notebooks(src_directory, dst_directory):
+def make_reader_friendly_notebook(notebook_path, src_directory, dst_directory, stream=False):
+    """Make a single notebook reader friendly.
+
+    Arguments
+    ---------
+    notebook_path : pathlib.Path
+        The path to the source notebook. Must be inside of src_directory.
+    src_directory : pathlib.Path
+        The path to the source directory.
+    dst_directory : pathlib.Path
+        The path to the directory where the processed notebook will be placed.
+    stream : bool
+        Whether to use the streaming engine, which processes the notebook one cell at
+        a time instead of reading it into memory all at once. The output is the same.
+
+    """
+    friendly_notebook_path = dst_directory / (notebook_path.relative_to(src_directory))
+    friendly_notebook_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if stream:
+        try:
+            with notebook_path.open() as src_fileobj, \
+                    open_atomically(friendly_notebook_path) as dst_fileobj:
+                stream_reader_friendly_notebook(src_fileobj, dst_fileobj)
+            return
+        except _CannotStream:
+            # fall back to reading the whole notebook into memory
+            pass
+
+    notebook = read_notebook(notebook_path)
+
+    hide_cells(notebook)
+    transform_cells_by_directive(notebook)
+    clear_cell_toolbars(notebook)
+
+    write_notebook(friendly_notebook_path, notebook)
+
+
+def _try_make_reader_friendly_notebook(notebook_path, src_directory, dst_directory, stream):
+    """Make a notebook reader friendly, returning a description of the error if any.
+
+    Exceptions are turned into strings here so that they can always be sent back
+    from a worker process, even if the exception itself cannot be pickled.
+    """
+    try:
+        make_reader_friendly_notebook(notebook_path, src_directory, dst_directory, stream)
+    except Exception as exc:
+        return f'{type(exc).__name__}: {exc}'
+
+
+def make_reader_friendly_notebooks(
+        src_directory, dst_directory, jobs=1, manifest_path=None, stream=False):
     """Search for notebooks and make them reader friendly.
 
     Arguments
@@ -239,23 +656,141 @@ def make_reader_friendly_notebooks(src_directory, dst_directory):
         The path to the source directory that should be searched.
     dst_directory : pathlib.Path
         The path to the directory where the processed notebooks will be placed.
+    jobs : int
+        The number of worker processes to use. If 1, the notebooks are processed
+        serially in the current process. If 0, one worker per CPU is used.
+    manifest_path : Optional[pathlib.Path]
+        The path to the manifest used for incremental builds. If given, only the
+        notebooks which have changed since the manifest was written are processed,
+        and the manifest is updated. If None, every notebook is processed.
+    stream : bool
+        Whether to process each notebook one cell at a time using the streaming
+        engine. This bounds memory use by the size of the largest cell.
+
+    Returns
+    -------
+    dict
+        Maps the path of every notebook that could not be processed to a
+        description of the error. Empty if all notebooks were processed.
 
     """
-    for notebook_path in find_notebooks(src_directory):
-        notebook = read_notebook(notebook_path)
+    notebook_paths = sorted(find_notebooks(src_directory))
 
-        hide_cells(notebook)
-        transform_cells_by_directive(notebook)
-        clear_cell_toolbars(notebook)
+    if manifest_path is not None:
+        manifest = read_manifest(manifest_path)
+        configuration_hash = hash_configuration()
 
-        friendly_notebook_path = dst_directory / (notebook_path.relative_to(src_directory))
-        friendly_notebook_path.parent.mkdir(parents=True, exist_ok=True)
-        write_notebook(friendly_notebook_path, notebook)
+        if manifest['configuration'] == configuration_hash:
+            previous_hashes = manifest['notebooks']
+        else:
+            previous_hashes = {}
+
+        source_hashes = {
+            notebook_path.relative_to(src_directory).as_posix(): hash_file(notebook_path)
+            for notebook_path in notebook_paths
+        }
+
+        for relative_path in manifest['notebooks'].keys() - source_hashes.keys():
+            remove_output(dst_directory, pathlib.Path(relative_path))
+
+        notebook_paths = [
+            notebook_path for notebook_path in notebook_paths
+            if _needs_update(notebook_path, src_directory, dst_directory,
+                             previous_hashes, source_hashes)
+        ]
+
+    failures = _make_reader_friendly_notebooks(
+        notebook_paths, src_directory, dst_directory, jobs, stream)
+
+    if manifest_path is not None:
+        # notebooks which failed are left out so that they are retried next time
+        failed = {
+            notebook_path.relative_to(src_directory).as_posix()
+            for notebook_path in failures
+        }
+        write_manifest(manifest_path, {
+            'configuration': configuration_hash,
+            'notebooks': {
+                relative_path: source_hash
+                for relative_path, source_hash in source_hashes.items()
+                if relative_path not in failed
+            }
+        })
+
+    return failures
+
+
+def _needs_update(notebook_path, src_directory, dst_directory, previous_hashes, source_hashes):
+    """Determines if a notebook has changed or its output is missing."""
+    relative_path = notebook_path.relative_to(src_directory).as_posix()
+    return (
+        previous_hashes.get(relative_path) != source_hashes[relative_path]
+        or not (dst_directory / relative_path).exists()
+    )
+
+
+def _make_reader_friendly_notebooks(notebook_paths, src_directory, dst_directory, jobs, stream):
+    """Make each of the notebooks reader friendly, returning a dict of failures."""
+    failures = {}
+
+    if jobs == 1:
+        for notebook_path in notebook_paths:
+            error = _try_make_reader_friendly_notebook(
+                notebook_path, src_directory, dst_directory, stream)
+            if error is not None:
+                failures[notebook_path] = error
+        return failures
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        futures = {
+            executor.submit(
+                _try_make_reader_friendly_notebook,
+                notebook_path, src_directory, dst_directory, stream
+            ): notebook_path
+            for notebook_path in notebook_paths
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                error = future.result()
+            except Exception as exc:
+                # the worker itself died, e.g., it was killed by the OS
+                error = f'{type(exc).__name__}: {exc}'
+
+            if error is not None:
+                failures[futures[future]] = error
+
+    return dict(sorted(failures.items()))
+
+
+def job_count(text):
+    """Parses a `--jobs` argument, which must be 0 (one per CPU) or more."""
+    jobs = int(text)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f'must be 0 or more, not {jobs}')
+    return jobs
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('src_directory', type=pathlib.Path)
+    parser.add_argument(
+        '--jobs', type=job_count, default=1,
+        help='number of worker processes; 0 means one per CPU (default: 1)')
+    parser.add_argument(
+        '--manifest', type=pathlib.Path,
+        help='build incrementally, recording what was built in this manifest file')
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='process notebooks one cell at a time to bound memory use')
     args = parser.parse_args()
 
-    make_reader_friendly_notebooks(args.src_directory, pathlib.Path.cwd())
+    failures = make_reader_friendly_notebooks(
+        args.src_directory, pathlib.Path.cwd(), jobs=args.jobs,
+        manifest_path=args.manifest, stream=args.stream)
+
+    for notebook_path, error in failures.items():
+        print(f'{notebook_path}: {error}', file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
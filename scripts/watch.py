@@ -0,0 +1,357 @@
+"""
+Rebuild the HTML and the reader-friendly notebooks whenever a source changes.
+
+`make html` and `make notebooks` start from scratch each time: a new Python
+process imports Sphinx, jupyter-book, and the extensions, loads the environment
+from disk, and only then finds what has changed. This script does that once, and
+keeps the Sphinx application, and with it the environment, in memory between
+builds.
+
+Usage
+-----
+    python watch.py [--interval SECONDS] [--once]
+
+Every `POLL_INTERVAL` seconds (or `--interval`), the modification times of the
+files under the watched directories are compared with those seen before. Once a
+change is seen, and the files have stopped changing, the warm application builds
+the HTML incrementally: Sphinx re-reads only the pages whose sources or
+dependencies changed (see `extensions/dependencygraph.py`), and writes only
+those and the pages which depend on them. If a notebook changed, only the
+reader-friendly notebooks whose sources changed are regenerated, using the same
+manifest as `make notebooks-incremental`. Notebooks whose code has not changed
+are not executed again, as their outputs are kept in the execution cache.
+
+When a data set changes, the notebooks which read it are removed from the
+execution cache, as in `cached_build.py restore`, so that they are executed again.
+
+When an extension changes, the extensions are imported afresh and a new
+application is created, which reads every page again with the new code. A new
+application is also created when `_config.yml` or `_toc.yml` changes; Sphinx
+itself decides what to read again.
+
+With `--once`, a single build is made and the script exits; this is useful to
+warm up the build directory, or to time a build.
+
+This script is invoked by the `watch` target in the Makefile at the root of the
+directory, and runs until interrupted with Ctrl-C.
+"""
+
+# configuration
+# ======================================================================================
+
+# all paths are relative to the root of the repository
+
+# where the book is built from, and where it is built to
+BOOK_DIRECTORY = 'src'
+BUILD_DIRECTORY = 'src/_build'
+OUTPUT_DIRECTORY = 'src/_build/html'
+
+# changes to files in these directories are picked up by an incremental build
+SOURCE_DIRECTORIES = ['src', 'data']
+
+# changes to files in these directories require a new Sphinx application
+EXTENSIONS_DIRECTORY = 'extensions'
+CONFIGURATION_FILES = ['src/_config.yml', 'src/_toc.yml']
+
+# where the reader-friendly notebooks are placed, as by `make notebooks-incremental`
+NOTEBOOKS_DIRECTORY = '_notebooks'
+NOTEBOOKS_MANIFEST = '.notebooks-manifest.json'
+
+# directories that should not be searched for files
+EXCLUDED_FROM_SEARCH = {'_build', '.ipynb_checkpoints', '__pycache__', '.cache'}
+
+# how often, in seconds, the directories are checked for changes
+POLL_INTERVAL = 0.2
+
+
+# ======================================================================================
+
+import argparse
+import contextlib
+import os
+import pathlib
+import sys
+import time
+import traceback
+
+import cached_build
+import make_reader_friendly_notebooks
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+# watching
+# ======================================================================================
+
+def snapshot(directories):
+    """Maps every file under the directories to its modification time."""
+    mtimes = {}
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDED_FROM_SEARCH]
+            for filename in filenames:
+                path = pathlib.Path(dirpath, filename)
+                try:
+                    mtimes[path] = path.stat().st_mtime_ns
+                except FileNotFoundError:
+                    # removed since it was listed
+                    pass
+    return mtimes
+
+
+def changed_paths(before, after):
+    """Returns the paths added, removed, or modified between two snapshots."""
+    return {
+        path for path in before.keys() | after.keys()
+        if before.get(path) != after.get(path)
+    }
+
+
+def wait_for_changes(directories, mtimes, interval):
+    """Waits until files under the directories change, and then stop changing.
+
+    Editors often save a file in several steps, so once a change is seen, the
+    directories are checked again until two checks in a row agree.
+
+    Returns
+    -------
+    Tuple[dict, set]
+        The new snapshot, and the paths which changed since `mtimes`.
+
+    """
+    while True:
+        time.sleep(interval)
+        current = snapshot(directories)
+        if changed_paths(mtimes, current):
+            break
+
+    while True:
+        time.sleep(interval)
+        settled = snapshot(directories)
+        if settled == current:
+            return settled, changed_paths(mtimes, settled)
+        current = settled
+
+
+# building
+# ======================================================================================
+
+def unload_extensions(root=ROOT):
+    """Forgets the extension modules, so that the next import reads their source."""
+    extensions_directory = root / EXTENSIONS_DIRECTORY
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path is not None and pathlib.Path(path).resolve().parent == extensions_directory:
+            del sys.modules[name]
+
+
+def create_application(stack, freshenv=False, root=ROOT):
+    """Creates the Sphinx application that `jupyter-book build src/` would.
+
+    Arguments
+    ---------
+    stack : contextlib.ExitStack
+        Holds the docutils patches the application is used within; they are
+        undone when the stack is closed.
+    freshenv : bool
+        Whether to read every page again, rather than load the environment kept
+        from the last build.
+
+    Returns
+    -------
+    sphinx.application.Sphinx
+        The application, ready to build.
+
+    """
+    # imported here, so that `--help` is fast
+    import yaml
+    from jupyter_book.config import get_final_config
+    from sphinx.application import Sphinx
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    book_directory = root / BOOK_DIRECTORY
+    sphinx_config, _ = get_final_config(
+        user_yaml=book_directory / '_config.yml',
+        cli_config={
+            'external_toc_path': (book_directory / '_toc.yml').as_posix(),
+            'latex_individualpages': False,
+        },
+        sourcedir=book_directory,
+        use_external_toc=True,
+    )
+
+    # directives and roles are registered with docutils globally, so the
+    # application is kept within these patches for as long as it is used
+    stack.enter_context(patch_docutils(None))
+    stack.enter_context(docutils_namespace())
+
+    app = Sphinx(
+        srcdir=str(book_directory),
+        confdir=None,
+        outdir=str(root / OUTPUT_DIRECTORY),
+        doctreedir=str(root / BUILD_DIRECTORY / '.doctrees'),
+        buildername='html',
+        confoverrides=sphinx_config,
+        status=sys.stdout,
+        warning=sys.stderr,
+        freshenv=freshenv,
+    )
+    app.srcdir = pathlib.Path(app.srcdir).as_posix()
+
+    # as jupyter-book does after creating the application
+    if app.config['use_multitoc_numbering']:
+        site_map = yaml.dump(app.config.external_site_map.as_json())
+        if 'numbered: true' in site_map:
+            app.setup_extension('sphinx_multitoc_numbering')
+
+    return app
+
+
+def save_assets(app):
+    """Returns copies of the lists of JavaScript and CSS files added to every page."""
+    return (
+        list(app.registry.js_files), list(app.registry.css_files),
+        list(app.builder.script_files), list(app.builder.css_files),
+    )
+
+
+def restore_assets(app, assets):
+    """Restores the lists of JavaScript and CSS files saved by `save_assets`.
+
+    Some extensions, such as sphinx-thebe, add their files when each build starts.
+    When one application builds many times, the files would be added again each
+    time, and so be included on each page several times.
+    """
+    (app.registry.js_files[:], app.registry.css_files[:],
+     app.builder.script_files[:], app.builder.css_files[:]) = assets
+
+
+def regenerate_notebooks(root=ROOT):
+    """Regenerates the reader-friendly notebooks whose sources have changed."""
+    notebooks_directory = root / NOTEBOOKS_DIRECTORY
+    notebooks_directory.mkdir(exist_ok=True)
+    failures = make_reader_friendly_notebooks.make_reader_friendly_notebooks(
+        root / BOOK_DIRECTORY, notebooks_directory,
+        manifest_path=root / NOTEBOOKS_MANIFEST)
+
+    for notebook_path, error in failures.items():
+        print(f'{notebook_path}: {error}', file=sys.stderr)
+
+
+def unstage_notebooks(root=ROOT):
+    """Unstages the notebooks which the build has executed, or tried to.
+
+    jupyter-book stages every notebook it reads in the execution cache, and never
+    unstages them; each build then hashes the code of every staged notebook, and
+    executes again every staged notebook whose outputs are not in the cache. A
+    notebook whose execution failed would be executed again on every build, even
+    when nothing it depends on has changed, and its error reported again.
+
+    Its error has already been reported by the build which read it, so after each
+    build every notebook of this book is unstaged. When the notebook, or a data set
+    it reads, changes, its page is read again, and the notebook is staged and
+    executed again by that build; a failing notebook is executed only then.
+    Notebooks staged from outside the book directory, by hand or by another book
+    sharing the cache, are left alone.
+    """
+    cache_path = root / BUILD_DIRECTORY / cached_build.EXECUTION_CACHE
+    if not cache_path.is_dir():
+        return
+
+    from jupyter_cache import get_cache
+
+    book_directory = (root / BOOK_DIRECTORY).resolve()
+    cache = get_cache(str(cache_path))
+    for record in cache.list_staged_records():
+        if book_directory in pathlib.Path(record.uri).resolve().parents:
+            cache.discard_staged_notebook(record.pk)
+
+
+def discard_data_dependents(paths, root=ROOT):
+    """Discards the executions of the notebooks which read any of the data sets."""
+    data_paths = {path.resolve() for path in paths if path.suffix != '.ipynb'}
+    notebooks = cached_build.find_dependent_notebooks(data_paths, root=root)
+    cached_build.discard_executions(
+        notebooks, root / BUILD_DIRECTORY / cached_build.EXECUTION_CACHE)
+
+
+# main
+# ======================================================================================
+
+def watch(interval=POLL_INTERVAL, once=False, root=ROOT):
+    """Builds the notes, and then again whenever a source changes, until interrupted.
+
+    Returns
+    -------
+    bool
+        With `once`, whether the build succeeded. Otherwise, True.
+
+    """
+    extensions_directory = root / EXTENSIONS_DIRECTORY
+    configuration_files = {root / name for name in CONFIGURATION_FILES}
+    directories = [root / name for name in SOURCE_DIRECTORIES] + [extensions_directory]
+
+    mtimes = snapshot(directories)
+    changed = set()
+    app = None
+    stack = contextlib.ExitStack()
+
+    # kept until a build with the reloaded extensions succeeds
+    reload_extensions = False
+
+    try:
+        while True:
+            start = time.perf_counter()
+            reload_extensions = reload_extensions or any(
+                path.parent == extensions_directory and path.suffix == '.py' for path in changed)
+
+            try:
+                if app is None or reload_extensions or changed & configuration_files:
+                    stack.close()
+                    if reload_extensions:
+                        unload_extensions(root)
+                    app = create_application(stack, freshenv=reload_extensions, root=root)
+                    assets = save_assets(app)
+
+                discard_data_dependents(
+                    {path for path in changed if path.is_file()}, root=root)
+                restore_assets(app, assets)
+                app.build()
+                unstage_notebooks(root)
+                regenerate_notebooks(root)
+            except Exception:
+                # e.g., a syntax error in an extension; wait for it to be fixed
+                traceback.print_exc()
+                app = None
+                print(f'build failed after {time.perf_counter() - start:.2f} s', flush=True)
+            else:
+                reload_extensions = False
+                print(f'built in {time.perf_counter() - start:.2f} s', flush=True)
+
+            if once:
+                return app is not None
+
+            print('waiting for changes...', flush=True)
+            mtimes, changed = wait_for_changes(directories, mtimes, interval)
+            for path in sorted(changed):
+                print(f'    {path.relative_to(root)} changed')
+
+    except KeyboardInterrupt:
+        return True
+
+    finally:
+        stack.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--interval', type=float, default=POLL_INTERVAL,
+        help=f'seconds between checks for changes (default: {POLL_INTERVAL})')
+    parser.add_argument(
+        '--once', action='store_true',
+        help='build once and exit')
+    args = parser.parse_args()
+
+    if not watch(interval=args.interval, once=args.once):
+        sys.exit(1)